@@ -1,43 +1,22 @@
 import os
 import json
+import asyncio
 from pathlib import Path
-from dotenv import load_dotenv
-from anthropic import Anthropic
 from fastapi import FastAPI
 from pydantic import BaseModel
+from agents.llm import call_llm_json, stream_llm
+from agents.jsonstream import JsonFieldStream, salvage_json
+from agents.extract import FIELDS, extract_fields
+from agents.batcher import MicroBatcher
+from agents.metrics import instrument, llm_repairs
+from agents import router
+from agents import resilience
 
 app = FastAPI()
 
 class PatientRequest(BaseModel):
     text: str
 
-# ---------------------------------------
-# Initialization
-# ---------------------------------------
-
-load_dotenv()
-client = Anthropic(api_key=os.getenv("ARYA_API_KEY"))
-
-
-# ---------------------------------------
-# LLM Caller
-# ---------------------------------------
-
-def call_llm(prompt: str):
-    response = client.messages.create(
-        model="claude-3-5-haiku-latest",
-        max_tokens=1000,
-        temperature=0,
-        messages=[
-            {
-                "role": "user",
-                "content": [{"type": "text", "text": prompt}]
-            }
-        ]
-    )
-    return response.content[0].text
-
-
 # ---------------------------------------
 # Agent 0 Prompt
 # ---------------------------------------
@@ -49,14 +28,14 @@ Your job is to take ANY unstructured clinical text about a patient
 and convert it into STRICT JSON with the following EXACT keys:
 
 {
+  "diagnosis": "",
   "name": "",
   "dob": "",
   "age": null,
   "sex": "",
   "pregnant": false,
   "allergies": [],
-  "conditions": [],
-  "diagnosis": ""
+  "conditions": []
 }
 
 RULES:
@@ -75,39 +54,52 @@ RULES:
 """
 
 
-# ---------------------------------------
-# Agent 0 Main Function
-# ---------------------------------------
+# Key order is output order: diagnosis first, so dependants can start on it
+# while the rest of the object is still streaming. The schema is the same
+# for every call (a per-call tools block would invalidate the cached
+# AGENT0_PROMPT prefix), so no key is required; build_prompt names the
+# keys a call needs and agent0_async keeps only those.
+PATIENT_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "diagnosis": {"type": "string"},
+        "name": {"type": "string"},
+        "dob": {"type": "string", "description": "YYYY-MM-DD or empty"},
+        "age": {"type": ["integer", "null"]},
+        "sex": {"type": "string", "enum": ["male", "female", "other", ""]},
+        "pregnant": {"type": "boolean"},
+        "allergies": {"type": "array", "items": {"type": "string"}},
+        "conditions": {"type": "array", "items": {"type": "string"}},
+    },
+}
 
-def agent0(text: str):
-    """
-    Input:
-        text (str) — raw patient description
 
-    Output:
-        dict — normalized patient JSON
-    """
+def empty_patient() -> dict:
+    return {
+        "diagnosis": "",
+        "name": "",
+        "dob": "",
+        "age": None,
+        "sex": "",
+        "pregnant": False,
+        "allergies": [],
+        "conditions": [],
+    }
 
-    prompt = f"{AGENT0_PROMPT}\n\nPatient text:\n{text}\n\nOutput JSON:"
-    raw = call_llm(prompt)
 
-    # Try to load JSON
-    try:
-        return json.loads(raw)
-    except:
-        # Repair attempt if model adds stray text
-        repair_prompt = f"""
+def build_repair_prompt(raw: str) -> str:
+    return f"""
 Fix the following into valid JSON ONLY, matching EXACTLY this schema:
 
 {{
+  "diagnosis": "",
   "name": "",
   "dob": "",
   "age": null,
   "sex": "",
   "pregnant": false,
   "allergies": [],
-  "conditions": [],
-  "diagnosis": ""
+  "conditions": []
 }}
 
 No explanation. JSON only.
@@ -115,23 +107,173 @@ No explanation. JSON only.
 Broken JSON:
 {raw}
 """
-        repaired = call_llm(repair_prompt)
-
-        try:
-            return json.loads(repaired)
-        except:
-            # Worst-case fallback
-            return {
-                "name": "",
-                "dob": "",
-                "age": None,
-                "sex": "",
-                "pregnant": False,
-                "allergies": [],
-                "conditions": [],
-                "diagnosis": ""
-            }
+
+
+# ---------------------------------------
+# LLM Extraction (low-confidence fields only)
+# ---------------------------------------
+
+# Fields the rule-based extractor is at least this sure about skip the LLM
+CONFIDENCE_THRESHOLD = float(os.getenv("AGENT0_CONFIDENCE_THRESHOLD", "0.8"))
+
+
+def build_prompt(text: str, fields: list = None) -> str:
+    """
+    Variable part of the extraction prompt; AGENT0_PROMPT goes ahead of it
+    as the cacheable prefix.
+    """
+    prompt = f"Patient text:\n{text}\n\n"
+    if fields and fields != FIELDS:
+        prompt += f"Only these keys are needed: {json.dumps(fields)}. Output a JSON object with exactly those keys.\n\n"
+    return prompt + "Output JSON:"
+
+
+async def llm_extract(text: str, fields: list, known: dict, on_field=None):
+    """
+    Stream the LLM extraction for `fields`. Returns the parsed JSON, or None
+    if neither the completion nor the repair attempt parsed. The repair
+    call runs on the escalated route.
+    """
+
+    parser = JsonFieldStream()
+    current = router.route("agent0", note_chars=len(text), fields=len(fields))
+
+    async def extract(r: dict) -> str:
+        chunks = []
+        stream = stream_llm(
+            build_prompt(text, fields),
+            prefix=AGENT0_PROMPT,
+            schema=PATIENT_SCHEMA,
+            model=r["model"],
+            max_tokens=r["max_tokens"],
+        )
+        async for chunk in stream:
+            chunks.append(chunk)
+            completed = parser.feed(chunk)
+            if on_field is not None:
+                for name in completed:
+                    if name in fields:
+                        on_field(name, {**known, **{k: v for k, v in parser.fields.items() if k in fields}})
+        return "".join(chunks)
+
+    raw = await router.timed(current, extract)
+
+    # Salvage locally first; the repair call is the last resort
+    data = salvage_json(raw)
+    if data is not None:
+        return data
+    llm_repairs.inc(agent="agent0")
+    return await router.timed(
+        router.escalate(current) or current,
+        lambda r: call_llm_json(build_repair_prompt(raw), schema=PATIENT_SCHEMA, model=r["model"], max_tokens=r["max_tokens"]),
+    )
+
+
+# ---------------------------------------
+# Micro-batching (optional)
+# ---------------------------------------
+
+# During bursts, pack concurrent extractions into one multi-patient prompt.
+# Off unless AGENT0_BATCH_WINDOW_MS > 0. Batched calls don't stream, so
+# they trade speculative start for fewer round trips per rate-limit unit.
+BATCH_WINDOW_MS = float(os.getenv("AGENT0_BATCH_WINDOW_MS", "0"))
+BATCH_MAX_ITEMS = int(os.getenv("AGENT0_BATCH_MAX_ITEMS", "8"))
+
+
+def build_batch_prompt(items: list) -> str:
+    prompt = f"""There are {len(items)} separate patients below. Extract each one independently.
+Output ONE JSON object whose keys are the patient numbers as strings
+("0", "1", ...) and whose values are that patient's JSON object, containing
+only the keys listed for that patient.
+"""
+    for index, (text, fields) in enumerate(items):
+        prompt += f"\n\nPatient {index} — keys: {json.dumps(fields)}\nPatient {index} text:\n{text}"
+    return prompt + "\n\nOutput JSON:"
+
+
+# Patient number -> PATIENT_SCHEMA object; static for the same reason
+BATCH_SCHEMA = {"type": "object", "additionalProperties": PATIENT_SCHEMA}
+
+
+async def llm_extract_batch(items: list) -> list:
+    data = await call_llm_json(
+        build_batch_prompt(items),
+        prefix=AGENT0_PROMPT,
+        schema=BATCH_SCHEMA,
+        max_tokens=min(8192, 1000 * len(items)),
+    ) or {}
+    return [
+        data.get(str(index)) if isinstance(data.get(str(index)), dict) else None
+        for index in range(len(items))
+    ]
+
+
+async def llm_extract_single(item: tuple):
+    text, fields = item
+    return await llm_extract(text, fields, {})
+
+
+batcher = MicroBatcher(
+    llm_extract_batch,
+    llm_extract_single,
+    window=BATCH_WINDOW_MS / 1000,
+    max_items=BATCH_MAX_ITEMS,
+)
+
+
+# ---------------------------------------
+# Agent 0 Main Function
+# ---------------------------------------
+
+@instrument("agent0")
+async def agent0_async(text: str, on_field=None):
+    """
+    Input:
+        text (str) — raw patient description
+        on_field (callable, optional) — called as on_field(name, fields)
+            each time a top-level field is known, where fields is everything
+            extracted so far. Lets callers start dependent work before the
+            LLM completion is done.
+
+    Output:
+        dict — normalized patient JSON
+    """
+
+    # Rule-based pass first; well-formed notes never reach the model
+    local, confidence = extract_fields(text)
+    known = {}
+    for name in FIELDS:
+        if confidence[name] >= CONFIDENCE_THRESHOLD:
+            known[name] = local[name]
+            if on_field is not None:
+                on_field(name, dict(known))
+
+    missing = [name for name in FIELDS if name not in known]
+    if not missing:
+        return {name: known[name] for name in FIELDS}
+
+    try:
+        if BATCH_WINDOW_MS > 0:
+            extracted = await batcher.submit((text, missing))
+        else:
+            extracted = await llm_extract(text, missing, known, on_field)
+    except resilience.UPSTREAM_ERRORS as err:
+        resilience.degrade("agent0", err)
+        extracted = None
+
+    # Worst-case fallback: the low-confidence local guesses beat empty fields
+    if not isinstance(extracted, dict):
+        extracted = local
+
+    patient = empty_patient()
+    patient.update(local)
+    patient.update({name: extracted[name] for name in missing if name in extracted})
+    return patient
+
+
+def agent0(text: str):
+    return asyncio.run(agent0_async(text))
 
 @app.post("/agent0")
-def run_agent0(payload: PatientRequest):
-    return agent0(payload.text)
\ No newline at end of file
+async def run_agent0(payload: PatientRequest):
+    return await agent0_async(payload.text)
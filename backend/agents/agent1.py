@@ -1,31 +1,55 @@
 import os
 import json
-from dotenv import load_dotenv
-from anthropic import Anthropic
+import asyncio
+from agents.llm import call_llm_json
+from agents.cache import TieredCache, make_key, normalize_text
+from agents.diagnoses import canonical_id
+from agents.metrics import instrument
+from agents.singleflight import SingleFlight
+from agents import router
+from agents import resilience
 
 # ---------------------------------------
-# Initialization
+# Candidate Cache
 # ---------------------------------------
 
-load_dotenv()
-client = Anthropic(api_key=os.getenv("ARYA_API_KEY"))
+# Candidates depend on the diagnosis plus a few patient traits, so that is
+# all we key on — and all we send to the model, so the key is exact.
+CACHE_TTL = float(os.getenv("AGENT1_CACHE_TTL", str(7 * 24 * 3600)))
+CACHE_SIZE = int(os.getenv("AGENT1_CACHE_SIZE", "1024"))
 
-# ---------------------------------------
-# LLM Caller
-# ---------------------------------------
+candidate_cache = TieredCache("agent1", ttl=CACHE_TTL, maxsize=CACHE_SIZE)
 
-def call_llm(prompt: str):
-    response = client.messages.create(
-        model="claude-3-5-haiku-latest",
-        max_tokens=1000,
-        temperature=0,
-        messages=[
-            {"role": "user", "content": [{"type": "text", "text": prompt}]}
-        ]
-    )
-    return response.content[0].text
+# Concurrent requests for the same cache key share one LLM call
+inflight = SingleFlight("agent1")
 
 
+def age_group(age):
+    try:
+        age = float(age)
+    except (TypeError, ValueError):
+        return "unknown"
+    if age < 12:
+        return "child"
+    if age < 18:
+        return "adolescent"
+    if age < 65:
+        return "adult"
+    return "older adult"
+
+
+def relevant_fields(patient: dict) -> dict:
+    return {
+        "diagnosis": normalize_text(patient.get("diagnosis")),
+        "age_group": age_group(patient.get("age")),
+        "pregnant": bool(patient.get("pregnant")),
+    }
+
+
+def cache_key(patient: dict) -> str:
+    fields = relevant_fields(patient)
+    return make_key(canonical_id(fields["diagnosis"]), fields["age_group"], fields["pregnant"])
+
 # ---------------------------------------
 # Agent 1 Prompt
 # ---------------------------------------
@@ -69,42 +93,85 @@ Now output ONLY the JSON described above.
 """
 
 
+CANDIDATES_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "diagnosis": {"type": "string"},
+        "candidate_treatments": {
+            "type": "array",
+            "items": {"type": "string"},
+            "maxItems": 10,
+        },
+    },
+    "required": ["diagnosis", "candidate_treatments"],
+}
+
+
+def build_repair_prompt(raw: str, diagnosis: str) -> str:
+    return f"""
+Fix this into valid JSON ONLY:
+
+{raw}
+
+Correct schema:
+
+{{
+  "diagnosis": "{diagnosis}",
+  "candidate_treatments": ["drug1", "drug2"]
+}}
+"""
+
+
 # ---------------------------------------
 # Agent 1 Main Function
 # ---------------------------------------
 
-def agent1(patient: dict) -> dict:
+@instrument("agent1")
+async def agent1_async(patient: dict) -> dict:
 
     diagnosis = (patient.get("diagnosis") or "").strip()
 
     if not diagnosis:
         return {"diagnosis": "", "candidate_treatments": []}
 
-    patient_json = json.dumps(patient, indent=2)
+    key = cache_key(patient)
+    cached = candidate_cache.get(key)
+    if cached is not None:
+        return cached
 
-    prompt = AGENT1_PROMPT.format(patient_json=patient_json)
-    raw = call_llm(prompt)
-
-    # Try parse
     try:
-        data = json.loads(raw)
-        return data
-    except:
-        repair_prompt = f"""
-Fix this into valid JSON ONLY:
+        return await inflight.do(key, lambda: fetch_candidates(patient, key))
+    except resilience.UPSTREAM_ERRORS as err:
+        resilience.degrade("agent1", err)
+        return {"diagnosis": diagnosis.lower(), "candidate_treatments": []}
 
-{raw}
 
-Correct schema:
+async def fetch_candidates(patient: dict, key: str) -> dict:
+    diagnosis = (patient.get("diagnosis") or "").strip()
+    patient_json = json.dumps(relevant_fields(patient), indent=2)
 
-{{
-  "diagnosis": "{diagnosis}",
-  "candidate_treatments": ["drug1", "drug2"]
-}}
-"""
-        repaired = call_llm(repair_prompt)
-        try:
-            return json.loads(repaired)
-        except:
-            return {"diagnosis": diagnosis.lower(), "candidate_treatments": []}
+    prompt = AGENT1_PROMPT.format(patient_json=patient_json)
+    current = router.route("agent1")
+    data = await router.with_escalation(
+        current,
+        lambda r: call_llm_json(
+            prompt,
+            schema=CANDIDATES_SCHEMA,
+            repair=lambda raw: build_repair_prompt(raw, diagnosis),
+            model=r["model"],
+            max_tokens=r["max_tokens"],
+        ),
+        valid=lambda data: bool(data and data.get("candidate_treatments")),
+    )
+    if data is None:
+        return {"diagnosis": diagnosis.lower(), "candidate_treatments": []}
 
+    # Only remember usable answers
+    if data.get("candidate_treatments"):
+        candidate_cache.set(key, data)
+
+    return data
+
+
+def agent1(patient: dict) -> dict:
+    return asyncio.run(agent1_async(patient))
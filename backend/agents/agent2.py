@@ -1,62 +1,45 @@
 import os
 import json
-from pathlib import Path
-from dotenv import load_dotenv
-from anthropic import Anthropic
+import asyncio
+from agents.llm import call_llm_json
+from agents.cache import TieredCache, make_key
+from agents.diagnoses import canonical_id
+from agents.rules import get_rules
+from agents.metrics import instrument
+from agents.singleflight import SingleFlight
+from agents import router
+from agents import resilience
 
 # ---------------------------------------
 # Initialization
 # ---------------------------------------
 
-load_dotenv()
-client = Anthropic(api_key=os.getenv("ARYA_API_KEY"))
+# Per-(diagnosis, drug) verdicts and per-diagnosis Links are cached
+# separately, so only drugs we have never classified go to the model.
+VERDICT_TTL = float(os.getenv("AGENT2_VERDICT_TTL", str(7 * 24 * 3600)))
+LINKS_TTL = float(os.getenv("AGENT2_LINKS_TTL", str(30 * 24 * 3600)))
 
-STATIC_PATH = Path(__file__).resolve().parent.parent / "static"
+verdict_cache = TieredCache("agent2_verdicts", ttl=VERDICT_TTL, maxsize=8192)
+links_cache = TieredCache("agent2_links", ttl=LINKS_TTL)
 
+# Concurrent identical research queries share one LLM call
+inflight = SingleFlight("agent2")
 
-# ---------------------------------------
-# Static Rules (Optional)
-# ---------------------------------------
-
-def load_outdated():
-    path = STATIC_PATH / "outdated_meds.json"
-    if not path.exists():
-        return {}
-    with open(path, "r") as f:
-        return json.load(f)
-
-
-# ---------------------------------------
-# LLM Caller (Correct Claude 3.5 Format)
-# ---------------------------------------
-
-def call_llm(prompt: str):
-    response = client.messages.create(
-        model="claude-3-5-haiku-latest",
-        max_tokens=3000,
-        temperature=0,
-        messages=[
-            {
-                "role": "user",
-                "content": [{"type": "text", "text": prompt}]
-            }
-        ]
-    )
-    return response.content[0].text
+# Unclassified drugs are evaluated this many per call, all chunks (and the
+# Links call) in parallel; <= 0 sends them all in one call
+CHUNK_SIZE = int(os.getenv("AGENT2_CHUNK_SIZE", "3"))
 
 
 # ---------------------------------------
 # Research Prompt — DRUGS ONLY
 # ---------------------------------------
 
-def llm_research_query(diagnosis: str, drug_list: list):
-
-    drug_json = json.dumps(drug_list)
-
-    prompt = f"""
+# Fixed instructions, sent as a cacheable prefix; only the diagnosis and
+# drug list (build_research_prompt) vary between calls.
+RESEARCH_PROMPT = """
 You are a medical research assistant.
 
-Your ONLY job is to evaluate MEDICATIONS related to the diagnosis: "{diagnosis}"
+Your ONLY job is to evaluate MEDICATIONS related to the diagnosis given at the end
 using CURRENT (2022–2025) high-quality evidence ONLY.
 
 Allowed:
@@ -73,9 +56,6 @@ STRICT RULES:
 - No dosages
 - No speculation
 
-Drugs to evaluate:
-{drug_json}
-
 For each drug:
 1. Determine if research SUPPORTS its use for the diagnosis.
    - supported → "valid_drug"
@@ -230,26 +210,55 @@ STRICT RULES:
 
 Output STRICT JSON ONLY:
 
-{{
+{
   "valid_drugs": [],
   "invalid_drugs": [],
-  "Links": {{
+  "Links": {
       "<title>": "<URL>"
-  }}
-}}
+  }
+}
+"""
+
+
+def build_research_prompt(diagnosis: str, drug_list: list, links: bool = True) -> str:
+
+    if not drug_list:
+        # Links-only call
+        return f"""
+Diagnosis: "{diagnosis}"
+
+No drugs to evaluate: return empty "valid_drugs" and "invalid_drugs" and fill in "Links" only.
 """
 
-    # First attempt
-    raw = call_llm(prompt)
+    drug_json = json.dumps(drug_list)
+    links_note = "" if links else '\nLinks are requested separately: return "Links" as {}.\n'
+
+    return f"""
+Diagnosis: "{diagnosis}"
+
+Drugs to evaluate:
+{drug_json}
+{links_note}"""
+
 
-    # Try JSON
-    try:
-        return json.loads(raw)
-    except:
-        pass
+RESEARCH_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "valid_drugs": {"type": "array", "items": {"type": "string"}},
+        "invalid_drugs": {"type": "array", "items": {"type": "string"}},
+        "Links": {
+            "type": "object",
+            "description": "Guideline or review title -> exact URL",
+            "additionalProperties": {"type": "string"},
+        },
+    },
+    "required": ["valid_drugs", "invalid_drugs", "Links"],
+}
 
+
+def build_repair_prompt(raw: str) -> str:
     # Repair prompt — SHORT, TOKEN-EFFICIENT
-    repair_prompt = f"""
+    return f"""
 Fix this into VALID JSON ONLY using the schema provided earlier. 
 No explanation. No extra text. Only JSON.
 
@@ -260,31 +269,192 @@ Broken:
 {raw}
     """
 
-    raw2 = call_llm(repair_prompt)
 
-    try:
-        return json.loads(raw2)
-    except:
-        return {
-            "valid_drugs": [],
-            "invalid_drugs": [],
-            "links": {}
-        }
+def empty_research() -> dict:
+    return {
+        "valid_drugs": [],
+        "invalid_drugs": [],
+        "Links": {}
+    }
+
+
+def classifies_all(data, drug_list: list) -> bool:
+    """
+    True if every requested drug got a verdict.
+    """
+    if data is None:
+        return False
+    answered = {
+        str(drug).lower().strip()
+        for drug in data.get("valid_drugs", []) + data.get("invalid_drugs", [])
+    }
+    return {str(drug).lower().strip() for drug in drug_list} <= answered
+
+
+async def llm_research_query(diagnosis: str, drug_list: list, links: bool = True):
+    """
+    Returns the parsed research JSON, or None if the model never produced
+    valid JSON (so callers don't cache a fallback). An answer that leaves
+    drugs unclassified is retried once on the strong model.
+
+    Every call shares RESEARCH_PROMPT and RESEARCH_SCHEMA, so verdict
+    chunks and the Links call all hit the same cached prompt prefix.
+    """
+
+    prompt = build_research_prompt(diagnosis, drug_list, links)
+    current = router.route("agent2", drugs=len(drug_list), links=links)
+
+    return await router.with_escalation(
+        current,
+        lambda r: call_llm_json(
+            prompt,
+            prefix=RESEARCH_PROMPT,
+            schema=RESEARCH_SCHEMA,
+            repair=build_repair_prompt,
+            model=r["model"],
+            max_tokens=r["max_tokens"],
+        ),
+        valid=lambda data: classifies_all(data, drug_list),
+    )
 
 
 # ---------------------------------------
-# Main Agent 2 Logic
+# Cached Research
 # ---------------------------------------
 
-def agent2(payload: dict):
+def verdict_key(diagnosis: str, drug: str) -> str:
+    return make_key(canonical_id(diagnosis), drug)
+
+
+def links_key(diagnosis: str) -> str:
+    return make_key(canonical_id(diagnosis))
+
+
+def research_key(diagnosis: str, drugs: list) -> str:
+    return make_key(canonical_id(diagnosis), sorted(drugs))
+
+
+def chunked(items: list, size: int) -> list:
     """
-    Expected payload:
-    {
-        "diagnosis": "...",
-        "candidate_treatments": ["drug1", "drug2", ...]
-    }
+    Split items into the fewest chunks of at most `size`, as even as
+    possible (10 by 3 -> 3, 3, 2, 2), so no single call is the straggler.
+    """
+    if not items:
+        return []
+    if size <= 0:
+        return [items]
+    count = -(-len(items) // size)
+    base, extra = divmod(len(items), count)
+    chunks = []
+    start = 0
+    for index in range(count):
+        end = start + base + (index < extra)
+        chunks.append(items[start:end])
+        start = end
+    return chunks
+
+
+async def research_chunk(diagnosis: str, chunk: list) -> dict:
+    """
+    {drug: "valid" | "invalid"} for the drugs in `chunk` the model
+    classified, also written to the verdict cache.
     """
+    llm_data = await inflight.do(
+        research_key(diagnosis, chunk),
+        lambda: llm_research_query(diagnosis, chunk, links=False),
+    )
+    if llm_data is None:
+        return {}
+
+    fresh = {}
+    for drug in llm_data.get("valid_drugs", []):
+        fresh[str(drug).lower().strip()] = "valid"
+    for drug in llm_data.get("invalid_drugs", []):
+        fresh[str(drug).lower().strip()] = "invalid"
 
+    verdicts = {}
+    for drug in chunk:
+        if drug in fresh:
+            verdicts[drug] = fresh[drug]
+            verdict_cache.set(verdict_key(diagnosis, drug), fresh[drug])
+    return verdicts
+
+
+async def research_links(diagnosis: str):
+    """
+    The diagnosis' guideline Links (cached), or None if the call failed.
+    """
+    llm_data = await inflight.do(
+        links_key(diagnosis),
+        lambda: llm_research_query(diagnosis, []),
+    )
+    if llm_data is None:
+        return None
+
+    links = llm_data.get("Links") or {}
+    links_cache.set(links_key(diagnosis), links)
+    return links
+
+
+async def cached_research(diagnosis: str, candidates: list) -> dict:
+    """
+    Settle drugs from the static rules, then the verdict cache, and ask the
+    model only about the rest. If the rules cover every candidate the model
+    is skipped even when Links aren't cached.
+
+    Uncached drugs are split into CHUNK_SIZE chunks; the chunks and the
+    Links call run concurrently and are merged here.
+    """
+
+    rules = get_rules().snapshot()
+
+    verdicts = {}
+    for drug in candidates:
+        verdict = rules.verdict(diagnosis, drug)
+        if verdict is not None:
+            verdicts[drug] = verdict
+    covered_by_rules = bool(candidates) and len(verdicts) == len(candidates)
+
+    for drug in candidates:
+        if drug in verdicts:
+            continue
+        verdict = verdict_cache.get(verdict_key(diagnosis, drug))
+        if verdict is not None:
+            verdicts[drug] = verdict
+
+    links = links_cache.get(links_key(diagnosis))
+    missing = [drug for drug in candidates if drug not in verdicts]
+
+    calls = [research_chunk(diagnosis, chunk) for chunk in chunked(missing, CHUNK_SIZE)]
+    fetch_links = links is None and not covered_by_rules
+    if fetch_links:
+        calls.append(research_links(diagnosis))
+
+    results = await asyncio.gather(*calls, return_exceptions=True)
+    for index, result in enumerate(results):
+        if isinstance(result, resilience.UPSTREAM_ERRORS):
+            # Rule and cached verdicts (and other chunks) still go out; this
+            # chunk's drugs stay unclassified
+            resilience.degrade("agent2", result)
+        elif isinstance(result, BaseException):
+            raise result
+        elif fetch_links and index == len(results) - 1:
+            links = result
+        else:
+            verdicts.update(result)
+
+    return {
+        "valid_drugs": [drug for drug in candidates if verdicts.get(drug) == "valid"],
+        "invalid_drugs": [drug for drug in candidates if verdicts.get(drug) == "invalid"],
+        "Links": links or {}
+    }
+
+
+# ---------------------------------------
+# Main Agent 2 Logic
+# ---------------------------------------
+
+def prepare_candidates(payload: dict):
     diagnosis = payload["diagnosis"].lower().strip()
     candidates = [c.lower().strip() for c in payload["candidate_treatments"]]
 
@@ -294,11 +464,12 @@ def agent2(payload: dict):
         if c.isalpha() or any(char.isdigit() for char in c)  # crude drug check
     ]
 
-    # Outdated static rules
-    outdated = load_outdated().get(diagnosis, [])
+    return diagnosis, candidates
+
 
-    # Query Research LLM
-    llm_data = llm_research_query(diagnosis, candidates)
+def apply_outdated(diagnosis: str, candidates: list, llm_data: dict):
+    # Outdated static rules
+    outdated = get_rules().snapshot().outdated_for(diagnosis)
 
     # Apply outdated override
     for med in candidates:
@@ -311,3 +482,25 @@ def agent2(payload: dict):
         "invalid_drugs": llm_data["invalid_drugs"],
         "links": llm_data.get("Links", {})
     }
+
+
+@instrument("agent2")
+async def agent2_async(payload: dict):
+    """
+    Expected payload:
+    {
+        "diagnosis": "...",
+        "candidate_treatments": ["drug1", "drug2", ...]
+    }
+    """
+
+    diagnosis, candidates = prepare_candidates(payload)
+
+    # Query Research LLM (cached verdicts first)
+    llm_data = await cached_research(diagnosis, candidates)
+
+    return apply_outdated(diagnosis, candidates, llm_data)
+
+
+def agent2(payload: dict):
+    return asyncio.run(agent2_async(payload))
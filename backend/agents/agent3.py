@@ -1,9 +1,13 @@
 import os
 import json
-from dotenv import load_dotenv
-from anthropic import Anthropic
+import asyncio
 from fastapi import FastAPI
 from pydantic import BaseModel
+from agents.llm import call_llm_json as call_structured
+from agents.medfilter import get_filter
+from agents.metrics import instrument, agent3_attempts
+from agents import router
+from agents import resilience
 
 app = FastAPI()
 
@@ -11,18 +15,18 @@ class PatientRequest(BaseModel):
     patient_json: dict  # JSON input containing only suggested_meds and basic patient info
 
 # ---------------------------------------
-# Initialization
+# Configuration
 # ---------------------------------------
 
-load_dotenv()
-client = Anthropic(api_key=os.getenv("ARYA_API_KEY"))
+# The local MedFilter decides everything it has data for. The LLM is an
+# opt-in fallback for meds the filter doesn't know, capped at MAX_ATTEMPTS.
+LLM_FALLBACK = os.getenv("AGENT3_LLM_FALLBACK", "0") == "1"
+MAX_ATTEMPTS = int(os.getenv("AGENT3_MAX_ATTEMPTS", "2"))
 
 # ---------------------------------------
 # LLM Caller (Strict JSON + Closed World)
 # ---------------------------------------
-def call_llm_json(prompt: str, patient_json: dict):
-
-    system_prompt = """
+FILTER_SYSTEM_PROMPT = """
 You are Agent Filter.
 
 You DO NOT have medical knowledge.
@@ -50,7 +54,9 @@ You operate under the following NON-NEGOTIABLE LAWS:
    Output MUST be valid JSON, no text outside JSON.
 """
 
-    user_prompt = f"""
+
+def build_user_prompt(patient_json: dict) -> str:
+    return f"""
 You will classify medications strictly using literal string comparisons only.
 
 Patient JSON:
@@ -75,47 +81,78 @@ Output JSON must be:
 Return ONLY JSON.
 """
 
-    while True:
-        response = client.messages.create(
-            model="claude-3-5-haiku-latest",
-            system=system_prompt,
-            messages=[{"role": "user", "content": user_prompt}],
-            temperature=0,
-            max_tokens=2000
-        )
 
-        raw = response.content[0].text.strip()
+# One static schema, so the tools block stays byte-identical and the cached
+# prefix (tools -> FILTER_SYSTEM_PROMPT) is reused; the closed set of med
+# names is enforced locally by matches_input
+FILTER_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "acceptable_meds": {"type": "array", "items": {"type": "string"}},
+        "unacceptable_meds": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "med": {"type": "string"},
+                    "reasons": {"type": "array", "items": {"type": "string"}},
+                },
+                "required": ["med", "reasons"],
+            },
+        },
+    },
+    "required": ["acceptable_meds", "unacceptable_meds"],
+}
+
 
-        try:
-            result = json.loads(raw)
-        except:
-            # repair stage
-            repair_prompt = f"""
+def build_repair_prompt(raw: str) -> str:
+    return f"""
 Output valid JSON only. Fix this:
 
 {raw}
 """
-            repair = client.messages.create(
-                model="claude-3-5-haiku-latest",
-                system="Return ONLY valid JSON.",
-                messages=[{"role": "user", "content": repair_prompt}],
-                temperature=0,
-                max_tokens=1000
-            )
-            try:
-                result = json.loads(repair.content[0].text.strip())
-            except:
-                continue
-
-        acceptable = [m for m in result.get("acceptable_meds", []) if isinstance(m, str)]
-        unacceptable = [item.get("med") for item in result.get("unacceptable_meds", []) if isinstance(item.get("med"), str)]
 
-        output_meds = set(acceptable + unacceptable)
-        input_meds = set(patient_json.get("suggested_meds", []))
 
-        if output_meds == input_meds:
+def matches_input(result: dict, patient_json: dict) -> bool:
+    acceptable = [m for m in result.get("acceptable_meds", []) if isinstance(m, str)]
+    unacceptable = [item.get("med") for item in result.get("unacceptable_meds", []) if isinstance(item.get("med"), str)]
+
+    output_meds = set(acceptable + unacceptable)
+    input_meds = set(patient_json.get("suggested_meds", []))
+
+    return output_meds == input_meds
+
+
+async def call_llm_json(prompt: str, patient_json: dict, max_attempts: int = MAX_ATTEMPTS):
+    """
+    Returns a result whose med set matches suggested_meds exactly, or None
+    once max_attempts is used up. Every failed attempt escalates the route,
+    so retries run on the strong model.
+    """
+    user_prompt = build_user_prompt(patient_json)
+    meds = patient_json.get("suggested_meds", [])
+    current = router.route("agent3", meds=len(meds))
+
+    for attempt in range(max_attempts):
+        if attempt:
+            current = router.escalate(current) or current
+        agent3_attempts.inc()
+        result = await router.timed(
+            current,
+            lambda r: call_structured(
+                user_prompt,
+                system=FILTER_SYSTEM_PROMPT,
+                schema=FILTER_SCHEMA,
+                repair=build_repair_prompt,
+                model=r["model"],
+                max_tokens=r["max_tokens"],
+            ),
+        )
+        if result is not None and matches_input(result, patient_json):
             return result
 
+    return None
+
 # ---------------------------------------
 # Medication Filter Prompt
 # ---------------------------------------
@@ -147,15 +184,61 @@ Output STRICT JSON ONLY:
 # ---------------------------------------
 # Main Filtering Function
 # ---------------------------------------
-def agent3(patient_json: dict):
-    prompt = MED_FILTER_PROMPT + "\n\nPatient data:\n" + json.dumps(patient_json, indent=2)
-    result = call_llm_json(prompt, patient_json)
-
-    # Normalize reasons
+def normalize_reasons(result: dict):
     for item in result.get("unacceptable_meds", []):
         item["reasons"] = [str(r).strip() for r in item.get("reasons", [])]
 
     return result
 
 
+def merge_results(local: dict, fallback: dict) -> dict:
+    """
+    Fold the LLM's verdicts for unverified meds into the local result. The
+    LLM only settles meds the filter couldn't check; it never clears one
+    the filter rejected.
+    """
+    flagged = {
+        item["med"]: item.get("reasons", [])
+        for item in fallback.get("unacceptable_meds", [])
+        if isinstance(item, dict) and isinstance(item.get("med"), str)
+    }
+    cleared = {m for m in fallback.get("acceptable_meds", []) if isinstance(m, str)}
+
+    unverified = local.get("unverified_meds", [])
+    acceptable = list(local["acceptable_meds"]) + [m for m in unverified if m in cleared and m not in flagged]
+    unacceptable = list(local["unacceptable_meds"])
+    unacceptable += [{"med": m, "reasons": flagged[m]} for m in unverified if m in flagged]
+
+    return {
+        "acceptable_meds": acceptable,
+        "unacceptable_meds": unacceptable,
+        "unverified_meds": [m for m in unverified if m not in cleared and m not in flagged],
+    }
+
+
+@instrument("agent3")
+async def agent3_async(patient_json: dict, use_llm: bool = None):
+    med_filter = get_filter()
+    result = med_filter.classify(patient_json)
+
+    if LLM_FALLBACK if use_llm is None else use_llm:
+        # Meds the table doesn't know stay unverified unless the model checks them
+        unknown = result["unverified_meds"]
+        if unknown:
+            subset = dict(patient_json, suggested_meds=unknown)
+            prompt = MED_FILTER_PROMPT + "\n\nPatient data:\n" + json.dumps(subset, indent=2)
+            try:
+                fallback = await call_llm_json(prompt, subset)
+            except resilience.UPSTREAM_ERRORS as err:
+                # Keep the rule-based classification
+                resilience.degrade("agent3", err)
+                fallback = None
+            if fallback is not None:
+                result = merge_results(result, fallback)
+
+    # Normalize reasons
+    return normalize_reasons(result)
+
 
+def agent3(patient_json: dict):
+    return asyncio.run(agent3_async(patient_json))
@@ -1,65 +1,27 @@
-import requests
+import asyncio
 import json
-from anthropic import Anthropic
-import os
-
-client = Anthropic(api_key=os.getenv("ARYA_API_KEY"))
+from agents.llm import call_llm
+from agents.jsonstream import salvage_json
+from agents.pubmed import get_pubmed
+from agents.diagnoses import get_index
+from agents.metrics import instrument
+from agents import router
+from agents import resilience
 
 # ----------------------------------------------------
 # Step 1 — Fetch REAL research using PubMed API
 # ----------------------------------------------------
-def fetch_pubmed_results(diagnosis: str):
-    query = diagnosis.replace(" ", "+")
-    url = f"https://eutils.ncbi.nlm.nih.gov/entrez/eutils/esearch.fcgi"
-    params = {
-        "db": "pubmed",
-        "term": query,
-        "retmode": "json",
-        "retmax": "10"     # only grab top 10 IDs
-    }
-
-    try:
-        resp = requests.get(url, params=params, timeout=10).json()
-    except:
-        return []
-
-    ids = resp.get("esearchresult", {}).get("idlist", [])
-    if not ids:
-        return []
-
-    # Fetch paper details
-    detail_url = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/esummary.fcgi"
-    detail_params = {
-        "db": "pubmed",
-        "id": ",".join(ids),
-        "retmode": "json"
-    }
-
-    try:
-        detail_resp = requests.get(detail_url, params=detail_params, timeout=10).json()
-    except:
-        return []
-
-    papers = []
-    for pid in ids:
-        data = detail_resp.get("result", {}).get(pid)
-        if not data:
-            continue
-
-        title = data.get("title", "")
-        url = f"https://pubmed.ncbi.nlm.nih.gov/{pid}/"
-
-        papers.append({"title": title, "url": url})
-
-    return papers
+async def fetch_pubmed_results(diagnosis: str):
+    # Search by canonical name so synonyms share one cached query.
+    # Pooled, rate-limited and cached — see agents/pubmed.py
+    return await get_pubmed().search(get_index().canonical_name(diagnosis), retmax=10)
 
 
 # ----------------------------------------------------
 # Step 2 — Claude summarizer (NO URL hallucinations)
 # ----------------------------------------------------
-def summarize_pubmed(diagnosis: str, papers: list):
-
-    prompt = f"""
+def build_summary_prompt(diagnosis: str, papers: list) -> str:
+    return f"""
 You are Agent 4: Research Summarizer.
 
 You ONLY choose from the papers provided below.
@@ -82,31 +44,43 @@ Return STRICT JSON ONLY:
 }}
 """
 
-    response = client.messages.create(
-        model="claude-3-5-haiku-latest",
-        temperature=0,
-        max_tokens=700,
-        messages=[{"role": "user", "content": prompt}]
-    )
 
-    return response.content[0].text
+async def summarize_pubmed(diagnosis: str, papers: list):
+    prompt = build_summary_prompt(diagnosis, papers)
+    current = router.route("agent4", papers=len(papers))
+
+    return await router.timed(
+        current,
+        lambda r: call_llm(prompt, model=r["model"], max_tokens=r["max_tokens"]),
+    )
 
 
 # ----------------------------------------------------
 # Step 3 — Agent 4 main
 # ----------------------------------------------------
-def agent4(diagnosis: str):
-    papers = fetch_pubmed_results(diagnosis)
+@instrument("agent4")
+async def agent4_async(diagnosis: str):
+    try:
+        papers = await fetch_pubmed_results(diagnosis)
+    except resilience.UPSTREAM_ERRORS as err:
+        resilience.degrade("agent4", err)
+        papers = []
 
     if not papers:
         return {"diagnosis": diagnosis, "research": []}
 
-    summary = summarize_pubmed(diagnosis, papers)
-
     try:
-        return json.loads(summary)
-    except:
-        return {
-            "diagnosis": diagnosis,
-            "research": papers[:5]
-        }
+        summary = await summarize_pubmed(diagnosis, papers)
+    except resilience.UPSTREAM_ERRORS as err:
+        # Unranked PubMed hits are still real papers
+        resilience.degrade("agent4", err)
+        summary = ""
+
+    return salvage_json(summary) or {
+        "diagnosis": diagnosis,
+        "research": papers[:5]
+    }
+
+
+def agent4(diagnosis: str):
+    return asyncio.run(agent4_async(diagnosis))
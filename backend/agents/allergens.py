@@ -0,0 +1,30 @@
+import re
+
+# ---------------------------------------
+# Allergen wording
+# ---------------------------------------
+#
+# Shared by agent0's rule-based extraction (extract.py) and agent3's
+# filter (medfilter.py), so both read "PCN - hives" the same way.
+
+# Reaction text after an allergen: "penicillin - hives", "sulfa: rash"
+REACTION_SPLIT = r"\s+[-–—]\s+|\s*:\s*|\s*->\s*|\s+(?:causes?|causing|caused|with|leading to|results? in|resulting in|reaction)\b"
+REACTION_WORDS = {
+    "anaphylaxis", "anaphylactic", "hives", "rash", "urticaria", "swelling", "angioedema",
+    "itching", "itch", "nausea", "vomiting", "intolerance", "sensitivity", "reaction", "severe", "mild",
+}
+
+
+def clean_allergen(item: str) -> str:
+    """
+    "Penicillin allergy (anaphylaxis)", "allergic to sulfa: rash" -> the
+    allergen alone, lowercased.
+    """
+    item = re.sub(r"\([^)]*\)|\[[^\]]*\]", " ", str(item or "").lower())
+    item = re.split(REACTION_SPLIT, item, maxsplit=1)[0]
+    words = [w for w in item.replace("_", " ").split() if not w.startswith("allerg") and w != "to"]
+    while words and words[-1] in REACTION_WORDS:
+        words.pop()
+    while words and words[0] in REACTION_WORDS:
+        words.pop(0)
+    return " ".join(words).strip(" .,;:-")
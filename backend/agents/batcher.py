@@ -0,0 +1,77 @@
+import asyncio
+from agents import resilience
+
+# ---------------------------------------
+# Micro-batching
+# ---------------------------------------
+
+class MicroBatcher:
+    """
+    Collects concurrent submit() calls for up to `window` seconds (or until
+    `max_items` are waiting) and hands them to `batch_fn` as one list.
+
+    batch_fn(items) must return a list the same length as items; an entry
+    of None means "no answer for this item". Items without an answer — or
+    every item, if batch_fn raises or returns the wrong shape — are retried
+    one at a time through single_fn(item). Each caller gets its own result
+    or its own exception.
+
+    Batches run outside any one caller's request context; each caller
+    waits only as long as its own deadline allows.
+    """
+
+    def __init__(self, batch_fn, single_fn, window: float = 0.02, max_items: int = 8):
+        self.batch_fn = batch_fn
+        self.single_fn = single_fn
+        self.window = window
+        self.max_items = max_items
+        self._pending = []
+        self._timer = None
+
+    async def submit(self, item):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+
+        if len(self._pending) >= self.max_items:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush, context=resilience.detached())
+
+        return await resilience.within(future)
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        batch, self._pending = self._pending, []
+        if batch:
+            asyncio.get_running_loop().create_task(self._run(batch), context=resilience.detached())
+
+    async def _run(self, batch: list):
+        items = [item for item, _ in batch]
+        results = [None] * len(batch)
+
+        if len(batch) > 1:
+            try:
+                answer = await self.batch_fn(items)
+                if isinstance(answer, list) and len(answer) == len(batch):
+                    results = answer
+            except Exception:
+                pass
+
+        async def settle(index: int):
+            item, future = batch[index]
+            if future.done():
+                return
+            try:
+                result = results[index]
+                if result is None:
+                    result = await self.single_fn(item)
+                future.set_result(result)
+            except Exception as err:
+                if not future.done():
+                    future.set_exception(err)
+
+        await asyncio.gather(*(settle(i) for i in range(len(batch))))
@@ -0,0 +1,219 @@
+import os
+import re
+import copy
+import json
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from agents import metrics
+
+# ---------------------------------------
+# Initialization
+# ---------------------------------------
+
+CACHE_DIR = os.getenv("CACHE_DIR", str(Path(__file__).resolve().parent.parent / ".cache"))
+CACHE_DB = "cache.db"
+EVICT_EVERY = 100
+
+
+def normalize_text(value: str) -> str:
+    """
+    Lowercase, drop punctuation and collapse whitespace so that trivially
+    different spellings share a cache key.
+    """
+    value = re.sub(r"[^\w\s-]", " ", (value or "").lower())
+    return " ".join(value.split())
+
+
+def make_key(*parts) -> str:
+    return json.dumps(parts, sort_keys=True, separators=(",", ":"))
+
+
+# ---------------------------------------
+# In-memory tier (LRU + TTL)
+# ---------------------------------------
+
+class MemoryCache:
+    def __init__(self, maxsize: int = 1024, ttl: float = 3600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return copy.deepcopy(value)
+
+    def set(self, key: str, value, ttl: float = None):
+        expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, copy.deepcopy(value))
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+# ---------------------------------------
+# On-disk tier (SQLite, LRU by last access)
+# ---------------------------------------
+
+class SQLiteCache:
+    def __init__(self, namespace: str, path: str = None, max_entries: int = 100_000, ttl: float = 86400):
+        self.namespace = namespace
+        self.path = path or os.path.join(CACHE_DIR, CACHE_DB)
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = None
+        self._writes = 0
+
+    def _connect(self):
+        if self._conn is None:
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS cache (
+                    namespace TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    expires_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL,
+                    PRIMARY KEY (namespace, key)
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS cache_lru ON cache (namespace, accessed_at)")
+            self._conn = conn
+        return self._conn
+
+    def get(self, key: str):
+        entry = self.get_entry(key)
+        return None if entry is None else entry[0]
+
+    def get_entry(self, key: str):
+        """
+        Returns (value, expires_at) or None.
+        """
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute(
+                "SELECT value, expires_at FROM cache WHERE namespace = ? AND key = ?",
+                (self.namespace, key),
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] < now:
+                conn.execute("DELETE FROM cache WHERE namespace = ? AND key = ?", (self.namespace, key))
+                return None
+            conn.execute(
+                "UPDATE cache SET accessed_at = ? WHERE namespace = ? AND key = ?",
+                (now, self.namespace, key),
+            )
+        return json.loads(row[0]), row[1]
+
+    def set(self, key: str, value, ttl: float = None):
+        now = time.time()
+        expires_at = now + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO cache (namespace, key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (self.namespace, key, json.dumps(value), expires_at, now),
+            )
+            # Counting rows is O(n); only sweep every EVICT_EVERY writes
+            self._writes += 1
+            if self._writes % EVICT_EVERY == 0:
+                self._evict(conn, now)
+
+    def _evict(self, conn, now: float):
+        conn.execute("DELETE FROM cache WHERE namespace = ? AND expires_at < ?", (self.namespace, now))
+        count = conn.execute("SELECT COUNT(*) FROM cache WHERE namespace = ?", (self.namespace,)).fetchone()[0]
+        if count > self.max_entries:
+            conn.execute(
+                """
+                DELETE FROM cache WHERE namespace = ? AND key IN (
+                    SELECT key FROM cache WHERE namespace = ?
+                    ORDER BY accessed_at ASC LIMIT ?
+                )
+                """,
+                (self.namespace, self.namespace, count - self.max_entries),
+            )
+
+    def delete(self, key: str):
+        with self._lock:
+            self._connect().execute("DELETE FROM cache WHERE namespace = ? AND key = ?", (self.namespace, key))
+
+    def clear(self):
+        with self._lock:
+            self._connect().execute("DELETE FROM cache WHERE namespace = ?", (self.namespace,))
+
+
+# ---------------------------------------
+# Memory in front of disk
+# ---------------------------------------
+
+class TieredCache:
+    """
+    Memory first, then SQLite. Disk hits are promoted into memory.
+    Set CACHE_DIR="" to run memory-only.
+    """
+
+    def __init__(self, namespace: str, ttl: float = 86400, maxsize: int = 1024, max_entries: int = 100_000):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.memory = MemoryCache(maxsize=maxsize, ttl=ttl)
+        self.disk = SQLiteCache(namespace, max_entries=max_entries, ttl=ttl) if CACHE_DIR else None
+
+    def get(self, key: str):
+        value = self.memory.get(key)
+        if value is not None:
+            metrics.cache_requests.inc(namespace=self.namespace, result="hit")
+            return value
+        entry = self.disk.get_entry(key) if self.disk is not None else None
+        if entry is None:
+            metrics.cache_requests.inc(namespace=self.namespace, result="miss")
+            return None
+        value, expires_at = entry
+        self.memory.set(key, value, ttl=expires_at - time.time())
+        metrics.cache_requests.inc(namespace=self.namespace, result="disk_hit")
+        return value
+
+    def set(self, key: str, value, ttl: float = None):
+        self.memory.set(key, value, ttl)
+        if self.disk is not None:
+            self.disk.set(key, value, ttl)
+
+    def delete(self, key: str):
+        self.memory.delete(key)
+        if self.disk is not None:
+            self.disk.delete(key)
+
+    def clear(self):
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
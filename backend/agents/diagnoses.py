@@ -0,0 +1,219 @@
+import os
+import json
+import threading
+from pathlib import Path
+import httpx
+from agents.cache import normalize_text
+
+# ---------------------------------------
+# Initialization
+# ---------------------------------------
+
+STATIC_PATH = Path(__file__).resolve().parent.parent / "static"
+
+# Minimum trigram similarity (Dice) for a fuzzy match
+FUZZY_THRESHOLD = float(os.getenv("DIAGNOSIS_FUZZY_THRESHOLD", "0.6"))
+
+# Words that make a clinically different diagnosis; a fuzzy match never
+# adds, drops or swaps one (nor any word with a digit, e.g. "type 1")
+QUALIFIERS = {
+    "acute", "subacute", "chronic", "recurrent",
+    "viral", "bacterial", "fungal", "streptococcal",
+    "complicated", "uncomplicated", "severe",
+    "externa", "media", "interna",
+    "community", "hospital", "ventilator", "healthcare", "acquired", "aspiration",
+    "pulmonary", "gestational", "juvenile", "secondary", "primary",
+    "upper", "lower", "allergic", "vaginal",
+}
+
+SUPABASE_URL = os.getenv("SUPABASE_URL") or os.getenv("VITE_SUPABASE_URL")
+SUPABASE_KEY = os.getenv("SUPABASE_ANON_KEY") or os.getenv("VITE_SUPABASE_ANON_KEY")
+
+# Prefix for diagnoses we have no canonical entry for
+UNKNOWN_PREFIX = "dx:"
+
+# Bound on memoized free-text lookups
+RESOLVED_MAX = 10_000
+
+
+def phrase_key(text: str) -> str:
+    """
+    Normalized, token-sorted phrase — "sinusitis, acute bacterial" and
+    "acute bacterial sinusitis" share a key.
+    """
+    return " ".join(sorted(normalize_text(text).split()))
+
+
+def trigrams(text: str) -> set:
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def similarity(a: str, b: str) -> float:
+    grams_a, grams_b = trigrams(a), trigrams(b)
+    return 2 * len(grams_a & grams_b) / (len(grams_a) + len(grams_b))
+
+
+def qualifiers(words: list) -> set:
+    return {w for w in words if w in QUALIFIERS or any(c.isdigit() for c in w)}
+
+
+def misspelling_of(key: str, phrase: str) -> bool:
+    """
+    True if `key` is `phrase` with typos only: the same number of words,
+    the same qualifiers, and every other word a close spelling of one in
+    the phrase.
+    """
+    words, target = key.replace("-", " ").split(), phrase.replace("-", " ").split()
+    if len(words) != len(target) or qualifiers(words) != qualifiers(target):
+        return False
+
+    unmatched = [w for w in target if w not in words]
+    for word in (w for w in words if w not in target):
+        close = [t for t in unmatched if len(word) >= 4 and similarity(word, t) >= FUZZY_THRESHOLD]
+        if not close:
+            return False
+        unmatched.remove(max(close, key=lambda t: similarity(word, t)))
+    return True
+
+
+# ---------------------------------------
+# Canonicalization Index
+# ---------------------------------------
+
+class DiagnosisIndex:
+    """
+    Maps free-text diagnoses to a canonical ID (the ICD-10 code where we
+    have one). Lookup order: exact phrase (names, synonyms, abbreviations,
+    token-order independent), then a trigram fuzzy match that only
+    forgives misspellings (see misspelling_of). Anything else gets a
+    stable "dx:<normalized text>" ID so it still caches consistently.
+
+    `version` increases whenever entries are added, so dependants (e.g.
+    the rules store) know to re-key.
+    """
+
+    def __init__(self, entries: list = None):
+        self._lock = threading.Lock()
+        self.names = {}
+        self.phrases = {}
+        self.grams = {}
+        self.version = 0
+        self._resolved = {}
+        for entry in entries or []:
+            self.add(entry["id"], entry["name"], entry.get("synonyms", []) + entry.get("abbreviations", []))
+
+    @classmethod
+    def load(cls, path: Path = STATIC_PATH / "diagnoses.json"):
+        if not path.exists():
+            return cls()
+        with open(path, "r") as f:
+            return cls(json.load(f))
+
+    def add(self, canonical_id: str, name: str, aliases: list = ()):
+        with self._lock:
+            self.names.setdefault(canonical_id, normalize_text(name))
+            for phrase in [name, *aliases]:
+                key = phrase_key(phrase)
+                if not key or key in self.phrases:
+                    continue
+                self.phrases[key] = canonical_id
+                for gram in trigrams(key):
+                    self.grams.setdefault(gram, set()).add(key)
+            self._resolved.clear()
+            self.version += 1
+
+    def _fuzzy(self, key: str):
+        grams = trigrams(key)
+        counts = {}
+        for gram in grams:
+            for phrase in self.grams.get(gram, ()):
+                counts[phrase] = counts.get(phrase, 0) + 1
+
+        scored = []
+        for phrase, shared in counts.items():
+            score = 2 * shared / (len(grams) + len(trigrams(phrase)))
+            if score >= FUZZY_THRESHOLD:
+                scored.append((score, phrase))
+        for _, phrase in sorted(scored, reverse=True):
+            if misspelling_of(key, phrase):
+                return self.phrases[phrase]
+        return None
+
+    def canonical_id(self, diagnosis: str) -> str:
+        key = phrase_key(diagnosis)
+        if not key:
+            return ""
+
+        cached = self._resolved.get(key)
+        if cached is not None:
+            return cached
+
+        canonical = self.phrases.get(key)
+        if canonical is None and len(key) >= 4:
+            canonical = self._fuzzy(key)
+        if canonical is None:
+            canonical = UNKNOWN_PREFIX + key
+
+        if len(self._resolved) >= RESOLVED_MAX:
+            self._resolved.clear()
+        self._resolved[key] = canonical
+        return canonical
+
+    def canonical_name(self, diagnosis: str) -> str:
+        """
+        Preferred display/search name, or the normalized input if unknown.
+        """
+        canonical = self.canonical_id(diagnosis)
+        return self.names.get(canonical, normalize_text(diagnosis))
+
+    async def seed_from_supabase(self, url: str = SUPABASE_URL, key: str = SUPABASE_KEY) -> int:
+        """
+        Add every row of the Supabase `diagnoses` table that has a code, using
+        its first code as the canonical ID. Returns the number of rows added.
+        """
+        if not url or not key:
+            return 0
+
+        rows = await fetch_diagnosis_rows(url, key, select="diagnosis,codes")
+
+        added = 0
+        for row in rows:
+            codes = [c.strip().upper() for c in row.get("codes") or [] if c and c.strip()]
+            name = row.get("diagnosis") or ""
+            if codes and name.strip():
+                self.add(codes[0], name)
+                added += 1
+        return added
+
+
+async def fetch_diagnosis_rows(url: str = SUPABASE_URL, key: str = SUPABASE_KEY, **params) -> list:
+    """
+    Rows of the Supabase `diagnoses` table via PostgREST; params are passed
+    through (select, order, limit, ...). [] when Supabase isn't configured.
+    """
+    if not url or not key:
+        return []
+
+    async with httpx.AsyncClient(timeout=10) as client:
+        resp = await client.get(
+            f"{url.rstrip('/')}/rest/v1/diagnoses",
+            params=params,
+            headers={"apikey": key, "Authorization": f"Bearer {key}"},
+        )
+        resp.raise_for_status()
+        return resp.json()
+
+
+_index = None
+
+
+def get_index() -> DiagnosisIndex:
+    global _index
+    if _index is None:
+        _index = DiagnosisIndex.load()
+    return _index
+
+
+def canonical_id(diagnosis: str) -> str:
+    return get_index().canonical_id(diagnosis)
@@ -0,0 +1,386 @@
+import re
+from datetime import datetime
+from agents.allergens import clean_allergen
+
+# ---------------------------------------
+# Rule-based agent0 extraction
+# ---------------------------------------
+#
+# Semi-structured notes ("Patient: Sarah Lopez, DOB 1992-11-04, age 32,
+# female ... Allergic to penicillin ... diagnosis: ...") don't need a model.
+# Every field gets a value and a confidence in [0, 1]; agent0 only asks the
+# LLM for the fields that come back below its threshold.
+
+# Diagnosis first: it is what dependants wait on (see agent0.PATIENT_SCHEMA)
+FIELDS = ["diagnosis", "name", "dob", "age", "sex", "pregnant", "allergies", "conditions"]
+
+# Confidence levels
+EXPLICIT = 0.95      # matched a labelled pattern ("DOB 1992-11-04")
+INFERRED = 0.85      # matched an unlabelled but unambiguous pattern
+ABSENT = 0.9         # no cue word anywhere, so the field is genuinely missing
+UNSURE = 0.3         # cue words present but no pattern matched
+# Allergies and conditions are often stated without any cue word ("CKD
+# stage 3 and heart failure"), so silence about them is never trusted
+UNSTATED = 0.5
+
+# Cue words — if one of these shows up and no pattern matched, hand the
+# field to the LLM instead of guessing it is empty.
+CUES = {
+    "name": r"\b(patient|name|mr|mrs|ms|miss)\b",
+    "dob": r"\b(dob|d\.o\.b|born|birth)",
+    "age": r"\b(age|aged|years?|yrs?|yo|y/o|months?)\b",
+    "sex": r"\b(sex|gender)\b",
+    "pregnant": r"pregnan|gravid|trimester",
+    "allergies": r"allerg|nkda|nka\b",
+    "conditions": r"\b(history|pmh|hx|h/o|known|condition|comorbid|past medical)",
+    "diagnosis": r"\b(diagnos|dx|assessment|impression)",
+}
+
+FEMALE_WORDS = r"\b(female|woman|girl|she|her|mrs|ms|miss)\b"
+MALE_WORDS = r"\b(male|man|boy|he|his|mr)\b"
+
+NONE_WORDS = {"none", "no", "nil", "n/a", "na", "nkda", "nka", "denies", "no known allergies", "no known drug allergies", "anything", "nothing"}
+
+DATE_FORMATS = ["%Y-%m-%d", "%Y/%m/%d", "%m/%d/%Y", "%m-%d-%Y", "%d %B %Y", "%B %d %Y", "%d %b %Y", "%b %d %Y"]
+
+# Clause terminators for list-style fields
+CLAUSE_END = r"(?:\.(?:\s|$)|;|\n|$)"
+
+
+def _search(pattern: str, text: str, flags=re.IGNORECASE):
+    return re.search(pattern, text, flags)
+
+
+def _has_cue(field: str, text: str) -> bool:
+    return _search(CUES[field], text) is not None
+
+
+def _split_list(value: str) -> list:
+    parts = re.split(r",|;|/|\band\b|\bor\b|&", value, flags=re.IGNORECASE)
+    items = []
+    for part in parts:
+        item = re.sub(r"^\s*(to|of|include|includes|including)\s+", "", part.strip(), flags=re.IGNORECASE)
+        item = item.strip(" .:-").lower()
+        if item and item not in items:
+            items.append(item)
+    return items
+
+
+def _looks_like_list(items: list) -> bool:
+    # Long fragments usually mean the regex swallowed a sentence
+    return all(len(item.split()) <= 4 for item in items)
+
+
+# ---------------------------------------
+# Field extractors — each returns (value, confidence)
+# ---------------------------------------
+
+def extract_name(text: str):
+    # Keyword is case-insensitive, the name itself must be capitalized
+    match = _search(r"\b(?i:patient(?:\s+name)?|name)\s*[:\-]\s*([A-Z][A-Za-z'\-]+(?:[ \t]+[A-Z][A-Za-z'\-]+){0,3})", text, 0)
+    if match:
+        return match.group(1).strip(), EXPLICIT
+    return "", ABSENT if not _has_cue("name", text) else UNSURE
+
+
+def extract_dob(text: str):
+    match = _search(r"\b(?:dob|d\.o\.b\.?|date of birth|born(?: on)?)\s*[:\-]?\s*([0-9A-Za-z,/\- ]{6,20}?\d{2,4})\b", text)
+    if match:
+        raw = match.group(1).replace(",", " ").strip()
+        raw = " ".join(raw.split())
+        for fmt in DATE_FORMATS:
+            try:
+                return datetime.strptime(raw, fmt).strftime("%Y-%m-%d"), EXPLICIT
+            except ValueError:
+                continue
+        return "", UNSURE
+    return "", ABSENT if not _has_cue("dob", text) else UNSURE
+
+
+# A number right after one of these is a measurement or a duration, not an age
+VITALS = r"\b(?:t|temp|temperature|tmax|hr|heart rate|bp|rr|pulse|spo2|o2|sats?|wt|weight|ht|height|bmi|glucose|bg)\s*[:=]?\s*(?:of\s+|was\s+|is\s+)?$"
+DURATION = r"\b(?:for|past|last|over|since|x|about|almost|nearly|within|after)\s+(?:the\s+)?(?:past\s+|last\s+)?$"
+
+SEX_WORDS = r"(?:female|male|woman|man|girl|boy|[MF]\b)"
+AGE_WORDS = r"(?:yo|y/o|y\.o\.|years?[- ]old|yrs?[- ]old|year\s+old)"
+
+# "Jane Doe, 45F, presents with ..." — bare shorthand only counts at the
+# start of a clause or a name list, or right before the rest of the intro
+SHORTHAND = r"(?<![\d.])\b(\d{1,3})\s*([MF])\b(?!\.?\d|°)"
+SHORTHAND_BEFORE = r"(?:^|[,(:]|\b(?:a|an|is|pt|patient))\s*$"
+SHORTHAND_AFTER = r"^\s*(?:$|[,;)]|\.(?:\s|$)|with\b|w/|presents?|presenting|here\b|c/o|complain|who\b|in\b|pt\b|patient\b)"
+
+
+def _is_measurement(text: str, start: int) -> bool:
+    prefix = text[max(0, start - 25):start]
+    return _search(VITALS, prefix) is not None or _search(DURATION, prefix) is not None
+
+
+def _shorthand(text: str):
+    """
+    A "45F" / "66 M" match that reads as age and sex rather than a
+    temperature ("Temp 101.2 F") or a duration.
+    """
+    for match in re.finditer(SHORTHAND, text):
+        if _is_measurement(text, match.start()):
+            continue
+        line_start = text.rfind("\n", 0, match.start()) + 1
+        if _search(SHORTHAND_BEFORE, text[line_start:match.start()]) or _search(SHORTHAND_AFTER, text[match.end():]):
+            return match
+    return None
+
+
+def extract_age(text: str):
+    patterns = [
+        r"\bage[d]?\s*[:\-]?\s*(\d{1,3})\b",
+        r"(?<![\d.])\b(\d{1,3})\s*-?\s*" + AGE_WORDS,
+        # "32 years, female" — "years" alone is only an age next to the sex
+        r"(?<![\d.])\b(\d{1,3})\s*(?:years?|yrs?)\s*,?\s*" + SEX_WORDS,
+    ]
+    for pattern in patterns:
+        for match in re.finditer(pattern, text, re.IGNORECASE):
+            if not pattern.startswith(r"\bage") and _is_measurement(text, match.start()):
+                continue
+            age = int(match.group(1))
+            if 0 <= age <= 120:
+                return age, EXPLICIT
+
+    shorthand = _shorthand(text)
+    if shorthand and int(shorthand.group(1)) <= 120:
+        return int(shorthand.group(1)), EXPLICIT
+    return None, ABSENT if not _has_cue("age", text) else UNSURE
+
+
+def extract_sex(text: str):
+    labelled = _search(r"\b(?:sex|gender)\s*[:\-]?\s*(male|female|m|f|other|non-binary)\b", text)
+    if labelled:
+        value = labelled.group(1).lower()
+        return {"m": "male", "f": "female", "non-binary": "other"}.get(value, value), EXPLICIT
+
+    # "66 yo M", "32-year-old F", or bare "45F" in an intro
+    shorthand = _search(r"(?<![\d.])\b\d{1,3}\s*-?\s*(?i:" + AGE_WORDS + r")\s*([MF])\b", text, 0) or _shorthand(text)
+    if shorthand:
+        return ("male" if shorthand.group(shorthand.lastindex) == "M" else "female"), EXPLICIT
+
+    female = _search(FEMALE_WORDS, text) is not None
+    male = _search(MALE_WORDS, text) is not None
+    if female and not male:
+        return "female", INFERRED
+    if male and not female:
+        return "male", INFERRED
+    if not female and not male:
+        return "", ABSENT if not _has_cue("sex", text) else UNSURE
+    # Both ("female ... he") — ambiguous
+    return "", UNSURE
+
+
+# "her sister is pregnant", "family history of diabetes" — not the patient
+OTHER_PEOPLE = r"\b(family|fhx|fh|mother|mom|father|dad|sister|brother|daughter|son|wife|husband|partner|girlfriend|boyfriend|friend|cousin|aunt|uncle|niece|nephew|grandmother|grandfather|colleague|coworker|roommate)\b"
+NEGATIONS = {"no", "not", "denies", "denied", "without", "negative", "never", "nor"}
+
+# Labels that start a new field; a list value never runs past one
+LABEL = r"\b(?:today'?s\s+|final\s+|working\s+|primary\s+)?(?:diagnos\w*|dx|assessment|impression|pmh|hx|past medical history|medical history|conditions?|comorbidities|medications?|meds|plan|allerg\w*|pregnan\w*)\b"
+
+# Words that end a "<allergen> allergy" phrase when reading backwards
+ALLERGEN_STOP = NEGATIONS | {
+    "known", "any", "drug", "drugs", "food", "seasonal", "environmental", "severe", "mild", "moderate",
+    "reported", "documented", "history", "of", "a", "an", "the", "her", "his", "their", "with", "has",
+    "have", "had", "patient", "pt", "is", "reports", "states", "significant", "confirmed", "suspected",
+    "possible", "listed", "also", "but", "likely", "true", "in", "on", "to", "for", "she", "he",
+}
+
+
+def _clause_before(text: str, position: int) -> str:
+    """
+    The text between the start of the current clause and `position`.
+    """
+    boundary = max(text.rfind(mark, 0, position) for mark in (".", ";", "\n"))
+    return text[boundary + 1:position]
+
+
+def _negated(text: str, position: int) -> bool:
+    # A negation among the last three words of the same clause
+    words = re.findall(r"[a-z']+", _clause_before(text, position).lower())[-3:]
+    return any(word in NEGATIONS for word in words)
+
+
+def _about_someone_else(text: str, position: int) -> bool:
+    return _search(OTHER_PEOPLE, _clause_before(text, position)) is not None
+
+
+def _cut_at_label(value: str) -> str:
+    match = _search(LABEL, value)
+    return value[:match.start()] if match else value
+
+
+def _clean_term(item: str) -> bool:
+    """
+    A bare term ("penicillin", "type 2 diabetes"), not a sentence fragment,
+    a negation or another field's label.
+    """
+    words = item.split()
+    return (
+        re.fullmatch(r"[a-z][a-z0-9\-' ]*", item) is not None
+        and len(words) <= 4
+        and words[0] not in NEGATIONS
+        and _search(LABEL, item) is None
+    )
+
+
+def _allergen_list(value: str) -> list:
+    value = re.sub(r"\([^)]*\)|\[[^\]]*\]", " ", _cut_at_label(value))
+    items = [clean_allergen(item) for item in _split_list(value)]
+    return [item for item in items if item and item not in NONE_WORDS]
+
+
+def _allergens_before(text: str, position: int):
+    """
+    (allergens, negated) for a "<allergen> allergy" phrase ending at
+    `position`: "sulfa allergy", "peanut and shellfish allergies", "no
+    penicillin allergy".
+    """
+    prefix = re.sub(r"\([^)]*\)", " ", _clause_before(text, position).lower())
+    tokens = re.findall(r"[a-z0-9][a-z0-9\-']*|,|/|&", prefix)
+
+    # Skip qualifiers next to the word ("sulfa drug allergy")
+    while tokens and tokens[-1] in ALLERGEN_STOP and tokens[-1] not in NEGATIONS:
+        tokens.pop()
+
+    items, words = [], []
+    while tokens:
+        token = tokens.pop()
+        if token in {",", "/", "&", "and", "or"}:
+            if words:
+                items.append(" ".join(reversed(words)))
+                words = []
+            continue
+        if token in ALLERGEN_STOP:
+            if token in NEGATIONS:
+                return [], True
+            break
+        words.append(token)
+    if words:
+        items.append(" ".join(reversed(words)))
+    return [clean_allergen(item) for item in reversed(items) if clean_allergen(item)], False
+
+
+def extract_pregnant(text: str, sex: str):
+    if _search(r"\b(not|isn't|is not|denies|negative for|no)\s+(currently\s+)?(being\s+)?pregnan", text):
+        return False, EXPLICIT
+    if _search(r"\b(?:pregnancy test|upt|u?hcg|b-?hcg|beta[- ]hcg)\s*(?:was\s+|is\s+|:\s*)?(?:negative|neg)\b|\bnegative\s+(?:urine\s+|serum\s+)?(?:pregnancy test|upt|hcg)", text):
+        return False, EXPLICIT
+
+    # Mentions about the patient, not a relative or friend
+    own = [m for m in re.finditer(r"pregnan|gravid|trimester", text, re.IGNORECASE) if not _about_someone_else(text, m.start())]
+    if own:
+        for pattern in [
+            r"\b(?:is|currently|she'?s|am)\s+(?:currently\s+)?(?:\d{1,2}\s*(?:weeks?|wks?|months?)\s+)?pregnant\b",
+            r"\bpregnant\s+(?:female|woman|patient|pt)\b",
+            r"\b\d{1,2}\s*(?:weeks?|wks?)\s+(?:pregnant|gestation)",
+            r"\bgravid\b",
+            r"\b(?:first|second|third|1st|2nd|3rd)\s+trimester\b",
+            r"\bpositive\s+(?:urine\s+|serum\s+)?pregnancy test|\bpregnancy test\s*(?:was\s+|is\s+|:\s*)?positive\b",
+        ]:
+            for match in re.finditer(pattern, text, re.IGNORECASE):
+                if not _about_someone_else(text, match.start()):
+                    return True, INFERRED
+        # Mentioned, but not in a form we can read
+        return False, UNSURE
+
+    if sex == "male":
+        return False, EXPLICIT
+    if _has_cue("pregnant", text):
+        return False, UNSURE
+    # Schema default is false when nothing is stated
+    return False, ABSENT
+
+
+def extract_allergies(text: str):
+    if _search(r"\b(nkda|nka|no known (drug )?allergies|(no|denies|denied|without) (any )?(known )?(drug )?allergies|not allergic to (anything|any\w*)|allergies\s*[:\-]\s*(none|nil|n/a|nkda))\b", text):
+        return [], EXPLICIT
+
+    items, negated = [], False
+
+    # "Allergic to X", "Allergies: X, Y", "Allergy - X"
+    for match in re.finditer(r"\ballerg(?:ic|ies|y)\s*(?:to\b|:|-|\binclude\b|\bincludes\b)\s*(.+?)" + CLAUSE_END, text, re.IGNORECASE):
+        if _negated(text, match.start()):
+            negated = True
+            continue
+        items += _allergen_list(match.group(1))
+
+    # "Penicillin allergy", "sulfa and latex allergies"
+    for match in re.finditer(r"\ballerg(?:y|ies)\b(?!\s*(?:to\b|:|-|\binclude))", text, re.IGNORECASE):
+        found, was_negated = _allergens_before(text, match.start())
+        negated = negated or was_negated
+        items += found
+
+    items = list(dict.fromkeys(items))
+    if items:
+        # Anything that isn't a clean term means the note needs a model read
+        if all(_clean_term(item) for item in items):
+            return items, EXPLICIT
+        return [], UNSURE
+    if negated:
+        return [], EXPLICIT
+    return [], UNSTATED if not _has_cue("allergies", text) else UNSURE
+
+
+def extract_conditions(text: str):
+    if _search(r"\b(?:no|denies|denied)\s+(?:significant\s+)?(?:past\s+)?(?:medical\s+)?(?:history|pmh|medical conditions|chronic conditions)\b(?!\s+of)", text):
+        return [], EXPLICIT
+
+    patterns = [
+        r"\b(?:past |prior )?(?:medical )?conditions?\s*(?:include|includes|including|:|-)\s*(.+?)" + CLAUSE_END,
+        r"\b(?:pmh|past medical history|medical history)\s*(?:of|:|-|includes?|significant for)?\s*(.+?)" + CLAUSE_END,
+        r"\b(?:history of|hx of|h/o)\s+(.+?)" + CLAUSE_END,
+        r"\bhx\s*(?::|-|includes?|significant for)\s*(.+?)" + CLAUSE_END,
+        r"\bknown\s+(?!to\b|allerg|drug\b|case\b)(.+?)" + CLAUSE_END,
+        r"\bcomorbidities\s*(?:include|:|-)?\s*(.+?)" + CLAUSE_END,
+    ]
+    for pattern in patterns:
+        for match in re.finditer(pattern, text, re.IGNORECASE):
+            # "no history of asthma", "family history of heart disease"
+            if _negated(text, match.start()) or _about_someone_else(text, match.start()):
+                continue
+            items = [i for i in _split_list(_cut_at_label(match.group(1))) if i not in NONE_WORDS]
+            if all(_clean_term(item) for item in items):
+                return items, INFERRED
+            return [], UNSURE
+    return [], UNSTATED if not _has_cue("conditions", text) else UNSURE
+
+
+def extract_diagnosis(text: str):
+    match = _search(r"\b(?:(?:today'?s |final |working |primary )?diagnosis|dx|assessment|impression)\s*(?:is|of|:|-)\s*(.+?)" + CLAUSE_END, text)
+    if match is None:
+        match = _search(r"\bdiagnosed with\s+(.+?)" + CLAUSE_END, text)
+    if match:
+        diagnosis = match.group(1).strip(" .:-").lower()
+        if diagnosis and len(diagnosis.split()) <= 8:
+            return diagnosis, EXPLICIT
+        return "", UNSURE
+    # A missing diagnosis is worth a model look — it is often implied
+    return "", UNSURE
+
+
+# ---------------------------------------
+# Entry point
+# ---------------------------------------
+
+def extract_fields(text: str):
+    """
+    Returns (fields, confidence) — both dicts keyed by the agent0 schema.
+    """
+    text = text or ""
+    values = {}
+    confidence = {}
+
+    values["name"], confidence["name"] = extract_name(text)
+    values["dob"], confidence["dob"] = extract_dob(text)
+    values["age"], confidence["age"] = extract_age(text)
+    values["sex"], confidence["sex"] = extract_sex(text)
+    values["pregnant"], confidence["pregnant"] = extract_pregnant(text, values["sex"])
+    values["allergies"], confidence["allergies"] = extract_allergies(text)
+    values["conditions"], confidence["conditions"] = extract_conditions(text)
+    values["diagnosis"], confidence["diagnosis"] = extract_diagnosis(text)
+
+    return values, confidence
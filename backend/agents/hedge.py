@@ -0,0 +1,136 @@
+import os
+import asyncio
+import threading
+from collections import deque
+from agents import metrics
+
+# ---------------------------------------
+# Initialization
+# ---------------------------------------
+
+# Opt-in per agent: comma-separated names (e.g. "agent2"), "*" for all
+LLM_HEDGE_AGENTS = {a.strip() for a in os.getenv("LLM_HEDGE_AGENTS", "").split(",") if a.strip()}
+# Send the duplicate once a call is slower than this share of recent calls
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "0.95"))
+# Latencies remembered per agent, and how many are needed before hedging
+LLM_HEDGE_WINDOW = int(os.getenv("LLM_HEDGE_WINDOW", "500"))
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+# Extra load cap: at most this many hedges per primary call, on average
+LLM_HEDGE_BUDGET = float(os.getenv("LLM_HEDGE_BUDGET", "0.05"))
+LLM_HEDGE_BURST = float(os.getenv("LLM_HEDGE_BURST", "5"))
+
+
+def enabled(agent: str) -> bool:
+    return "*" in LLM_HEDGE_AGENTS or agent in LLM_HEDGE_AGENTS
+
+
+# ---------------------------------------
+# Latency tracking
+# ---------------------------------------
+
+class LatencyTracker:
+    """
+    Sliding window of recent call latencies per agent.
+    """
+
+    def __init__(self, window: int = LLM_HEDGE_WINDOW, min_samples: int = LLM_HEDGE_MIN_SAMPLES):
+        self.window = window
+        self.min_samples = min_samples
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def observe(self, agent: str, seconds: float):
+        with self._lock:
+            samples = self._samples.get(agent)
+            if samples is None:
+                samples = self._samples[agent] = deque(maxlen=self.window)
+            samples.append(seconds)
+
+    def percentile(self, agent: str, q: float):
+        """
+        The q-quantile of the agent's recent latencies, or None until there
+        are min_samples of them.
+        """
+        with self._lock:
+            samples = sorted(self._samples.get(agent, ()))
+        if len(samples) < self.min_samples:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+class HedgeBudget:
+    """
+    Token bucket: every primary call earns `ratio` tokens (up to `burst`),
+    every hedge spends one, so hedges stay under `ratio` of all calls.
+    """
+
+    def __init__(self, ratio: float = LLM_HEDGE_BUDGET, burst: float = LLM_HEDGE_BURST):
+        self.ratio = ratio
+        self.burst = burst
+        self.tokens = burst
+        self._lock = threading.Lock()
+
+    def earn(self):
+        with self._lock:
+            self.tokens = min(self.burst, self.tokens + self.ratio)
+
+    def spend(self) -> bool:
+        with self._lock:
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+
+latencies = LatencyTracker()
+budget = HedgeBudget()
+
+
+# ---------------------------------------
+# Hedged calls
+# ---------------------------------------
+
+def succeeded(task: asyncio.Task, valid) -> bool:
+    return not task.cancelled() and task.exception() is None and valid(task.result())
+
+
+def discard(task: asyncio.Task):
+    # The losing call's outcome is never awaited; mark it retrieved
+    if not task.cancelled():
+        task.exception()
+
+
+async def hedged(call, agent: str, valid=lambda result: True):
+    """
+    await call(), sending a second call() if the first hasn't finished by
+    the agent's LLM_HEDGE_PERCENTILE latency. The first result that passes
+    valid() wins and the other call is cancelled; if neither does, the
+    primary's result (or exception) is returned.
+    """
+    delay = latencies.percentile(agent, LLM_HEDGE_PERCENTILE) if enabled(agent) else None
+    if delay is None:
+        return await call()
+
+    budget.earn()
+    primary = asyncio.ensure_future(call())
+    backup = None
+    try:
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        if done or not budget.spend():
+            return await primary
+
+        metrics.llm_hedges.inc(agent=agent, result="sent")
+        backup = asyncio.ensure_future(call())
+        pending = {primary, backup}
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if succeeded(task, valid):
+                    metrics.llm_hedges.inc(agent=agent, result="won" if task is backup else "lost")
+                    return task.result()
+        return primary.result()
+    finally:
+        for task in (primary, backup):
+            if task is not None:
+                task.cancel()
+                task.add_done_callback(discard)
@@ -0,0 +1,183 @@
+import re
+import json
+
+# ---------------------------------------
+# Incremental JSON field parser
+# ---------------------------------------
+
+class JsonFieldStream:
+    """
+    Feed a JSON object in arbitrary chunks and get each top-level field back
+    the moment its value is complete, e.g.
+
+        stream = JsonFieldStream()
+        stream.feed('{"name": "Sa')        -> {}
+        stream.feed('rah", "age": 32,')    -> {"name": "Sarah", "age": 32}
+
+    Anything before the first "{" (prose, code fences) is skipped. Values are
+    decoded with json.loads, so a field is only reported once it is valid.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.fields = {}
+        self.done = False
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._expect = "start"
+        self._key_start = None
+        self._key = None
+        self._value_start = None
+
+    def feed(self, chunk: str) -> dict:
+        self.buffer += chunk
+        completed = {}
+
+        while self._pos < len(self.buffer) and not self.done:
+            i = self._pos
+            ch = self.buffer[i]
+            self._pos += 1
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._depth == 1:
+                        if self._expect == "key_string":
+                            self._key = json.loads(self.buffer[self._key_start:i + 1])
+                            self._expect = "colon"
+                        elif self._expect == "value":
+                            self._complete(i + 1, completed)
+                continue
+
+            if self._expect == "start":
+                if ch == "{":
+                    self._depth = 1
+                    self._expect = "key"
+                continue
+
+            if self._depth > 1:
+                if ch == '"':
+                    self._in_string = True
+                elif ch in "{[":
+                    self._depth += 1
+                elif ch in "}]":
+                    self._depth -= 1
+                    if self._depth == 1:
+                        self._complete(i + 1, completed)
+                continue
+
+            # depth == 1
+            if self._expect == "key":
+                if ch == '"':
+                    self._in_string = True
+                    self._key_start = i
+                    self._expect = "key_string"
+                elif ch == "}":
+                    self.done = True
+            elif self._expect == "colon":
+                if ch == ":":
+                    self._expect = "value"
+                    self._value_start = None
+            elif self._expect == "value":
+                if self._value_start is None:
+                    if ch.isspace():
+                        continue
+                    self._value_start = i
+                    if ch == '"':
+                        self._in_string = True
+                    elif ch in "{[":
+                        self._depth += 1
+                elif ch in ",}" or ch.isspace():
+                    # end of a bare literal (number, true, false, null)
+                    self._complete(i, completed)
+                    if ch == ",":
+                        self._expect = "key"
+                    elif ch == "}":
+                        self.done = True
+            elif self._expect == "separator":
+                if ch == ",":
+                    self._expect = "key"
+                elif ch == "}":
+                    self.done = True
+
+        return completed
+
+    def _complete(self, end: int, completed: dict):
+        try:
+            value = json.loads(self.buffer[self._value_start:end])
+        except ValueError:
+            value = None
+        else:
+            self.fields[self._key] = value
+            completed[self._key] = value
+        self._expect = "separator"
+        self._value_start = None
+
+
+# ---------------------------------------
+# Local salvage
+# ---------------------------------------
+
+FENCE = re.compile(r"```(?:json)?\s*(.*?)```", re.DOTALL | re.IGNORECASE)
+
+
+def first_object(text: str):
+    """
+    The first balanced {...} in text (string-aware), or None.
+    """
+    start = text.find("{")
+    while start != -1:
+        depth = 0
+        in_string = False
+        escape = False
+        for i in range(start, len(text)):
+            ch = text[i]
+            if in_string:
+                if escape:
+                    escape = False
+                elif ch == "\\":
+                    escape = True
+                elif ch == '"':
+                    in_string = False
+            elif ch == '"':
+                in_string = True
+            elif ch == "{":
+                depth += 1
+            elif ch == "}":
+                depth -= 1
+                if depth == 0:
+                    return text[start:i + 1]
+        start = text.find("{", start + 1)
+    return None
+
+
+def salvage_json(raw: str):
+    """
+    Parse model output as a JSON object without another LLM call: try it
+    as-is, then inside code fences, then the first balanced object.
+    Returns a dict, or None if nothing usable is there.
+    """
+    if not raw:
+        return None
+
+    candidates = [raw.strip()]
+    candidates += [m.strip() for m in FENCE.findall(raw)]
+    for text in list(candidates):
+        obj = first_object(text)
+        if obj is not None:
+            candidates.append(obj)
+
+    for text in candidates:
+        try:
+            data = json.loads(text)
+        except ValueError:
+            continue
+        if isinstance(data, dict):
+            return data
+    return None
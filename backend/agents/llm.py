@@ -0,0 +1,358 @@
+import os
+import json
+import time
+import asyncio
+import weakref
+import httpx
+from dotenv import load_dotenv
+from agents.jsonstream import salvage_json
+from agents import metrics
+from agents.llmstore import get_store
+from agents import resilience
+from agents import hedge
+from anthropic import (
+    AsyncAnthropic,
+    APIConnectionError,
+    APIStatusError,
+    APITimeoutError,
+)
+
+# ---------------------------------------
+# Initialization
+# ---------------------------------------
+
+load_dotenv()
+
+DEFAULT_MODEL = os.getenv("LLM_MODEL", "claude-3-5-haiku-latest")
+
+# Connection pool — one pool per process, shared by every agent
+MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "100"))
+MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "20"))
+KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "30"))
+REQUEST_TIMEOUT = float(os.getenv("LLM_REQUEST_TIMEOUT", "60"))
+
+# Retries live here and nowhere else (the SDK's own retries are disabled).
+# Each attempt's timeout is also capped by the request deadline.
+MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+RETRY_BASE_DELAY = float(os.getenv("LLM_RETRY_BASE_DELAY", "0.5"))
+RETRY_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504, 529}
+
+# Mark static system prompts / prompt prefixes with cache_control so the API
+# reuses their processed form across calls. Prefixes shorter than the model's
+# minimum cacheable length are simply not cached.
+PROMPT_CACHE = os.getenv("LLM_PROMPT_CACHE", "1") == "1"
+
+# Structured output goes through a single forced tool whose input_schema is
+# the agent's output schema; the tool input is the result.
+OUTPUT_TOOL = "record_output"
+
+# httpx pools are bound to the event loop that created them, so the client is
+# created lazily per loop. The server runs a single loop, so in practice this
+# is one client per process; the sync agent wrappers get a fresh one per call.
+_clients = weakref.WeakKeyDictionary()
+
+
+def get_client() -> AsyncAnthropic:
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+
+    if client is None:
+        http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=MAX_CONNECTIONS,
+                max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=KEEPALIVE_EXPIRY,
+            ),
+            timeout=REQUEST_TIMEOUT,
+        )
+        client = AsyncAnthropic(
+            api_key=os.getenv("ARYA_API_KEY"),
+            http_client=http_client,
+            max_retries=0,
+        )
+        _clients[loop] = client
+
+    return client
+
+
+def is_retryable(err: Exception) -> bool:
+    if isinstance(err, APIConnectionError):
+        return True
+    if isinstance(err, APIStatusError):
+        return err.status_code in RETRY_STATUS_CODES
+    return False
+
+
+def record_failure(breaker, err: Exception, timeout: float):
+    """
+    Tell the breaker about a failed call. Running out of the request's own
+    deadline (including an SDK timeout shortened to fit it) says nothing
+    about the upstream, so it is not counted either way.
+    """
+    if isinstance(err, resilience.DeadlineExceeded) or (isinstance(err, APITimeoutError) and timeout < REQUEST_TIMEOUT):
+        breaker.release()
+    else:
+        breaker.record(not is_retryable(err))
+
+
+# ---------------------------------------
+# Usage Accounting
+# ---------------------------------------
+
+USAGE_FIELDS = (
+    "input_tokens",
+    "output_tokens",
+    "cache_creation_input_tokens",
+    "cache_read_input_tokens",
+)
+
+# Process-wide token totals; cache_read > 0 confirms prefix cache hits
+usage_totals = {"calls": 0, **{field: 0 for field in USAGE_FIELDS}}
+
+
+def record_usage(usage) -> dict:
+    """
+    Add a response's usage block to usage_totals and return it as a dict.
+    """
+    counts = {field: getattr(usage, field, None) or 0 for field in USAGE_FIELDS}
+    usage_totals["calls"] += 1
+    agent = metrics.current_agent.get()
+    for field, count in counts.items():
+        usage_totals[field] += count
+        metrics.llm_tokens.inc(count, agent=agent, kind=field.replace("_input_tokens", "").replace("_tokens", ""))
+    return counts
+
+
+# ---------------------------------------
+# LLM Caller
+# ---------------------------------------
+
+def text_block(text: str, cache: bool = False) -> dict:
+    block = {"type": "text", "text": text}
+    if cache and PROMPT_CACHE:
+        block["cache_control"] = {"type": "ephemeral"}
+    return block
+
+
+def build_params(
+    prompt: str,
+    model: str,
+    max_tokens: int,
+    system: str,
+    temperature: float,
+    prefix: str = None,
+    schema: dict = None,
+) -> dict:
+    """
+    `system` and `prefix` are the static parts of a request and are marked
+    cacheable; `prompt` is the variable part and always goes last. With a
+    `schema`, the model is forced to answer through OUTPUT_TOOL.
+    """
+    content = [text_block(prompt)]
+    if prefix:
+        content.insert(0, text_block(prefix, cache=True))
+
+    params = {
+        "model": model or DEFAULT_MODEL,
+        "max_tokens": max_tokens,
+        "temperature": temperature,
+        "messages": [
+            {
+                "role": "user",
+                "content": content
+            }
+        ],
+    }
+    if system:
+        params["system"] = [text_block(system, cache=True)]
+    if schema:
+        params["tools"] = [{
+            "name": OUTPUT_TOOL,
+            "description": "Record the result. The input is the complete answer.",
+            "input_schema": schema,
+        }]
+        params["tool_choice"] = {"type": "tool", "name": OUTPUT_TOOL}
+    return params
+
+
+async def call_llm(
+    prompt: str,
+    *,
+    model: str = None,
+    max_tokens: int = 1000,
+    system: str = None,
+    temperature: float = 0,
+    prefix: str = None,
+):
+    """
+    Single entry point for every agent's model call.
+
+    Returns the text of the first content block.
+    """
+
+    params = build_params(prompt, model, max_tokens, system, temperature, prefix)
+    response = await create(params)
+    return response.content[0].text
+
+
+def message_text(message) -> str:
+    """
+    The text a stream of this message would have produced: text deltas, or
+    the tool input's JSON.
+    """
+    for block in message.content:
+        if block.type == "tool_use":
+            return json.dumps(block.input)
+        if block.type == "text":
+            return block.text
+    return ""
+
+
+async def create(params: dict):
+    """
+    messages.create with the response store, deadline, circuit breaker and
+    retries. Agents listed in LLM_HEDGE_AGENTS get hedged attempts: a
+    duplicate goes out once an attempt is slower than usual, and the first
+    usable response wins.
+    """
+    store = get_store()
+    stored = store.lookup(params)
+    if stored is not None:
+        return stored
+
+    agent = metrics.current_agent.get()
+    breaker = resilience.get_breaker("anthropic")
+    # A structured response that would need a repair call isn't a winner
+    usable = (lambda response: parse_structured(response)[0] is not None) if "tools" in params else (lambda response: True)
+
+    async def send(timeout: float):
+        sent = time.perf_counter()
+        response = await get_client().messages.create(**params, timeout=timeout)
+        hedge.latencies.observe(agent, time.perf_counter() - sent)
+        return response
+
+    attempt = 0
+    while True:
+        breaker.allow()
+        timeout = resilience.timeout(REQUEST_TIMEOUT)
+        started = time.perf_counter()
+        try:
+            response = await resilience.within(hedge.hedged(lambda: send(timeout), agent, usable))
+            breaker.record(True)
+            metrics.llm_seconds.observe(time.perf_counter() - started, agent=agent, mode="call")
+            record_usage(response.usage)
+            store.save(params, response)
+            return response
+        except Exception as err:
+            record_failure(breaker, err, timeout)
+            if attempt >= MAX_RETRIES or not is_retryable(err):
+                metrics.llm_errors.inc(agent=agent)
+                raise
+            metrics.llm_retries.inc(agent=agent)
+            await resilience.sleep(resilience.backoff(attempt, RETRY_BASE_DELAY))
+            attempt += 1
+
+
+def parse_structured(response):
+    """
+    (result, raw) for a schema-constrained response: the tool input if the
+    model used the tool, else a JSON object salvaged from its text.
+    """
+    raw = ""
+    for block in response.content:
+        if block.type == "tool_use" and isinstance(block.input, dict):
+            return block.input, json.dumps(block.input)
+        if block.type == "text":
+            raw += block.text
+    return salvage_json(raw), raw
+
+
+async def call_llm_json(
+    prompt: str,
+    *,
+    schema: dict,
+    repair=None,
+    model: str = None,
+    max_tokens: int = 1000,
+    system: str = None,
+    temperature: float = 0,
+    prefix: str = None,
+):
+    """
+    Schema-constrained call_llm that returns a dict, or None.
+
+    `repair(raw) -> prompt` is only used when neither the tool input nor a
+    local salvage of the text produced an object — one extra call, same
+    schema.
+    """
+
+    params = build_params(prompt, model, max_tokens, system, temperature, prefix, schema)
+    data, raw = parse_structured(await create(params))
+
+    if data is None and repair is not None:
+        metrics.llm_repairs.inc(agent=metrics.current_agent.get())
+        params = build_params(repair(raw), model, max_tokens, system, temperature, prefix, schema)
+        data, _ = parse_structured(await create(params))
+
+    return data
+
+
+async def stream_llm(
+    prompt: str,
+    *,
+    model: str = None,
+    max_tokens: int = 1000,
+    system: str = None,
+    temperature: float = 0,
+    prefix: str = None,
+    schema: dict = None,
+):
+    """
+    Streaming variant of call_llm — yields text deltas as they arrive. With
+    a `schema`, the deltas are the tool input's partial JSON instead.
+
+    Retries only happen before the first delta; once text has been handed
+    to the caller a failure is raised as-is.
+    """
+
+    params = build_params(prompt, model, max_tokens, system, temperature, prefix, schema)
+
+    # A stored response is replayed as a single delta
+    store = get_store()
+    stored = store.lookup(params)
+    if stored is not None:
+        yield message_text(stored)
+        return
+
+    agent = metrics.current_agent.get()
+    breaker = resilience.get_breaker("anthropic")
+    attempt = 0
+    while True:
+        breaker.allow()
+        timeout = resilience.timeout(REQUEST_TIMEOUT)
+        started = False
+        opened = time.perf_counter()
+        try:
+            async with get_client().messages.stream(**params, timeout=timeout) as stream:
+                async for event in stream:
+                    resilience.check()
+                    if event.type == "text":
+                        started = True
+                        yield event.text
+                    elif event.type == "input_json" and event.partial_json:
+                        started = True
+                        yield event.partial_json
+                message = await stream.get_final_message()
+                breaker.record(True)
+                metrics.llm_seconds.observe(time.perf_counter() - opened, agent=agent, mode="stream")
+                record_usage(message.usage)
+            store.save(params, message)
+            return
+        except Exception as err:
+            record_failure(breaker, err, timeout)
+            if started or attempt >= MAX_RETRIES or not is_retryable(err):
+                metrics.llm_errors.inc(agent=agent)
+                raise
+            metrics.llm_retries.inc(agent=agent)
+            await resilience.sleep(resilience.backoff(attempt, RETRY_BASE_DELAY))
+            attempt += 1
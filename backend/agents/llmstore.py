@@ -0,0 +1,184 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+from pathlib import Path
+from anthropic.types import Message
+from agents.cache import CACHE_DIR
+from agents import metrics
+
+# ---------------------------------------
+# Initialization
+# ---------------------------------------
+
+# off    — bypass the store entirely (default; the agent caches own freshness)
+# live   — serve stored responses younger than LLM_STORE_TTL, call the API
+#          (and store) on a miss
+# record — always call the API and overwrite what is stored
+# replay — stored responses only; a miss is an error, never a network call
+LLM_STORE_MODE = os.getenv("LLM_STORE_MODE", "off").lower()
+# Live-mode lifetime; kept no longer than the shortest agent cache TTL so a
+# stored response can't outlive the result it would rebuild
+LLM_STORE_TTL = float(os.getenv("LLM_STORE_TTL", str(7 * 24 * 3600)))
+LLM_STORE_PATH = os.getenv("LLM_STORE_PATH") or (os.path.join(CACHE_DIR, "llm_store.db") if CACHE_DIR else ":memory:")
+LLM_STORE_MAX_BYTES = int(os.getenv("LLM_STORE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+MODES = ("live", "record", "replay", "off")
+
+
+class ReplayMiss(LookupError):
+    """
+    Replay mode was asked for a request that was never recorded.
+    """
+
+
+def strip_cache_control(value):
+    # cache_control changes billing, not the answer, so it isn't part of the key
+    if isinstance(value, dict):
+        return {k: strip_cache_control(v) for k, v in value.items() if k != "cache_control"}
+    if isinstance(value, list):
+        return [strip_cache_control(v) for v in value]
+    return value
+
+
+def request_key(params: dict) -> str:
+    """
+    sha256 over the full request (model, system, messages, tools,
+    max_tokens, temperature, ...), independent of dict ordering.
+    """
+    canonical = json.dumps(strip_cache_control(params), sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+# ---------------------------------------
+# Response Store
+# ---------------------------------------
+
+class ResponseStore:
+    """
+    Content-addressed store of complete Messages API responses, in SQLite
+    (":memory:" when there is no cache directory). Evicts least recently
+    used responses once the stored JSON exceeds max_bytes.
+    """
+
+    def __init__(
+        self,
+        path: str = LLM_STORE_PATH,
+        mode: str = LLM_STORE_MODE,
+        max_bytes: int = LLM_STORE_MAX_BYTES,
+        ttl: float = LLM_STORE_TTL,
+    ):
+        if mode not in MODES:
+            raise ValueError(f"LLM_STORE_MODE must be one of {MODES}, got {mode!r}")
+        self.path = path
+        self.mode = mode
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = None
+        self._bytes = None
+
+    def _connect(self):
+        if self._conn is None:
+            if self.path != ":memory:":
+                Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    model TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS responses_lru ON responses (accessed_at)")
+            self._bytes = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            self._conn = conn
+        return self._conn
+
+    def cacheable(self, params: dict) -> bool:
+        if self.mode == "off":
+            return False
+        # Only deterministic requests are reused in live mode; record and
+        # replay keep everything so a run can be reproduced exactly
+        return self.mode != "live" or params.get("temperature", 1) == 0
+
+    def lookup(self, params: dict):
+        """
+        The stored Message for params, or None if the API should be called.
+        Raises ReplayMiss in replay mode instead of returning None.
+        """
+        if not self.cacheable(params) or self.mode == "record":
+            return None
+
+        key = request_key(params)
+        now = time.time()
+        # Replay serves whatever was recorded, however old
+        oldest = now - self.ttl if self.mode == "live" and self.ttl > 0 else 0
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute("SELECT value FROM responses WHERE key = ? AND created_at >= ?", (key, oldest)).fetchone()
+            if row is not None:
+                conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+
+        if row is None:
+            metrics.llm_store_requests.inc(result="miss")
+            if self.mode == "replay":
+                raise ReplayMiss(f"no recorded response for request {key[:12]}")
+            return None
+
+        metrics.llm_store_requests.inc(result="hit")
+        return Message.model_validate_json(row[0])
+
+    def save(self, params: dict, message: Message):
+        if not self.cacheable(params) or self.mode == "replay":
+            return
+
+        key = request_key(params)
+        value = message.model_dump_json()
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            old = conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, model, value, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, params.get("model", ""), value, len(value), now, now),
+            )
+            self._bytes += len(value) - (old[0] if old else 0)
+            if self._bytes > self.max_bytes:
+                self._evict(conn)
+
+    def _evict(self, conn):
+        # Trim to 90% so eviction doesn't run on every insert at the limit
+        target = self.max_bytes * 0.9
+        rows = conn.execute("SELECT key, size FROM responses ORDER BY accessed_at").fetchall()
+        doomed = []
+        for key, size in rows:
+            if self._bytes <= target:
+                break
+            doomed.append((key,))
+            self._bytes -= size
+        conn.executemany("DELETE FROM responses WHERE key = ?", doomed)
+
+    def clear(self):
+        with self._lock:
+            self._connect().execute("DELETE FROM responses")
+            self._bytes = 0
+
+
+_store = None
+
+
+def get_store() -> ResponseStore:
+    global _store
+    if _store is None:
+        _store = ResponseStore()
+    return _store
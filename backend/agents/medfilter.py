@@ -0,0 +1,179 @@
+import re
+import json
+from pathlib import Path
+from agents.allergens import clean_allergen
+
+# ---------------------------------------
+# Initialization
+# ---------------------------------------
+
+STATIC_PATH = Path(__file__).resolve().parent.parent / "static"
+
+
+def normalize(value) -> str:
+    return " ".join(str(value or "").lower().replace("_", " ").split())
+
+
+# Shorthand seen in allergy lists
+ALLERGY_ALIASES = {
+    "pcn": "penicillin",
+    "pen": "penicillin",
+    "asa": "aspirin",
+    "sulfa drug": "sulfa",
+    "sulfa drugs": "sulfa",
+    "sulpha": "sulfa",
+    "nsaid's": "nsaid",
+}
+
+def allergy_term(allergy) -> str:
+    """
+    "Penicillin allergy (anaphylaxis)", "PCN - hives" -> "penicillin"
+    """
+    term = clean_allergen(allergy)
+    return ALLERGY_ALIASES.get(term, term)
+
+
+def components(med: str) -> list:
+    """
+    "amoxicillin-clavulanate" -> ["amoxicillin-clavulanate", "amoxicillin", "clavulanate"]
+    """
+    name = normalize(med)
+    parts = [p for p in re.split(r"[-/+ ]+|\band\b", name) if p]
+    return [name] + [p for p in parts if p != name]
+
+
+def parse_age(age):
+    try:
+        return float(age)
+    except (TypeError, ValueError):
+        return None
+
+
+# ---------------------------------------
+# Medication Filter
+# ---------------------------------------
+
+class MedFilter:
+    """
+    Deterministic replacement for agent3's LLM classifier.
+
+    Built once from static/drug_classes.json into plain dict indexes:
+      drug -> classes, allergy term -> classes, condition -> classes.
+    classify() returns agent3's acceptable_meds / unacceptable_meds shape,
+    using the exact input strings for med names, plus unverified_meds for
+    meds the table doesn't know (nothing was checked, so they aren't
+    acceptable).
+    """
+
+    def __init__(self, table: dict):
+        self.drug_classes = {}
+        for cls, members in table.get("classes", {}).items():
+            for drug in members:
+                self.drug_classes.setdefault(normalize(drug), set()).add(cls)
+
+        self.allergy_classes = {
+            normalize(term): set(classes)
+            for term, classes in table.get("allergy_cross_reactivity", {}).items()
+        }
+        self.condition_classes = {
+            normalize(cond): set(classes)
+            for cond, classes in table.get("condition_contraindications", {}).items()
+        }
+        self.pregnancy_classes = set(table.get("pregnancy_contraindicated", []))
+        self.age_rules = table.get("age_restrictions", [])
+
+    @classmethod
+    def load(cls, path: Path = STATIC_PATH / "drug_classes.json"):
+        if not path.exists():
+            return cls({})
+        with open(path, "r") as f:
+            return cls(json.load(f))
+
+    def classes_for(self, med: str) -> set:
+        classes = set()
+        for part in components(med):
+            classes |= self.drug_classes.get(part, set())
+        return classes
+
+    def is_known(self, med: str) -> bool:
+        return bool(self.classes_for(med))
+
+    def reasons_for(self, med: str, patient: dict) -> list:
+        names = set(components(med))
+        classes = self.classes_for(med)
+        reasons = []
+
+        # Allergies — literal match, then class cross-reactivity
+        for allergy in patient.get("allergies") or []:
+            term = allergy_term(allergy)
+            if not term:
+                continue
+            if term in names:
+                reasons.append(f"allergy: {allergy}")
+                continue
+            allergic_classes = self.allergy_classes.get(term, set()) | self.drug_classes.get(term, set())
+            hit = sorted(classes & allergic_classes)
+            if hit:
+                reasons.append(f"allergy: {allergy} (cross-reactive: {', '.join(hit)})")
+
+        # Conditions — substring match so "severe asthma" hits "asthma"
+        for condition in patient.get("conditions") or []:
+            cond = normalize(condition)
+            if not cond:
+                continue
+            if cond in names:
+                reasons.append(f"condition: {condition}")
+                continue
+            for key, bad_classes in self.condition_classes.items():
+                hit = sorted(classes & bad_classes)
+                if key in cond and hit:
+                    reasons.append(f"condition: {condition} ({', '.join(hit)})")
+                    break
+
+        # Pregnancy
+        if patient.get("pregnant") is True:
+            hit = sorted(classes & self.pregnancy_classes)
+            if hit:
+                reasons.append(f"pregnant ({', '.join(hit)})")
+
+        # Age
+        age = parse_age(patient.get("age"))
+        if age is not None:
+            for rule in self.age_rules:
+                applies = rule.get("class") in classes or normalize(rule.get("drug")) in names
+                if applies and age < rule.get("min_age", 0):
+                    reasons.append(f"age: {age:g} (minimum {rule['min_age']})")
+                    break
+
+        return reasons
+
+    def classify(self, patient: dict) -> dict:
+        acceptable = []
+        unacceptable = []
+        unverified = []
+        seen = set()
+
+        for med in patient.get("suggested_meds") or []:
+            if not isinstance(med, str) or med in seen:
+                continue
+            seen.add(med)
+
+            reasons = self.reasons_for(med, patient)
+            if reasons:
+                unacceptable.append({"med": med, "reasons": reasons})
+            elif self.is_known(med):
+                acceptable.append(med)
+            else:
+                unverified.append(med)
+
+        return {"acceptable_meds": acceptable, "unacceptable_meds": unacceptable, "unverified_meds": unverified}
+
+
+_filter = None
+
+
+def get_filter() -> MedFilter:
+    global _filter
+    if _filter is None:
+        _filter = MedFilter.load()
+    return _filter
@@ -0,0 +1,191 @@
+import time
+import asyncio
+import functools
+import threading
+from contextvars import ContextVar
+
+# ---------------------------------------
+# Initialization
+# ---------------------------------------
+
+# Seconds; spans cache hits (ms) up to slow LLM completions
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# Which agent the current task is working for (labels gateway metrics)
+current_agent = ContextVar("current_agent", default="none")
+
+# Per-request {stage: seconds}, set by the server for Server-Timing
+request_timings = ContextVar("request_timings", default=None)
+
+_lock = threading.Lock()
+_registry = []
+
+
+def label_key(names: tuple, labels: dict) -> tuple:
+    return tuple(str(labels.get(name, "")) for name in names)
+
+
+def escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(names: tuple, values: tuple, **extra) -> str:
+    pairs = [f'{name}="{escape(value)}"' for name, value in zip(names, values)]
+    pairs += [f'{name}="{escape(value)}"' for name, value in extra.items()]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+# ---------------------------------------
+# Metric types
+# ---------------------------------------
+
+class Counter:
+    """
+    Monotonic counter with a fixed set of label names.
+    """
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.values = {}
+        _registry.append(self)
+
+    def inc(self, amount: float = 1, **labels):
+        key = label_key(self.labels, labels)
+        with _lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self) -> list:
+        return [
+            f"{self.name}{format_labels(self.labels, key)} {value}"
+            for key, value in sorted(self.values.items())
+        ]
+
+
+class Histogram:
+    """
+    Cumulative-bucket histogram, Prometheus style (_bucket/_sum/_count).
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = tuple(sorted(buckets))
+        self.values = {}
+        _registry.append(self)
+
+    def observe(self, value: float, **labels):
+        key = label_key(self.labels, labels)
+        with _lock:
+            entry = self.values.setdefault(key, {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0})
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry["buckets"][i] += 1
+            entry["sum"] += value
+            entry["count"] += 1
+
+    def render(self) -> list:
+        lines = []
+        for key, entry in sorted(self.values.items()):
+            for bound, n in zip(self.buckets, entry["buckets"]):
+                lines.append(f"{self.name}_bucket{format_labels(self.labels, key, le=str(bound))} {n}")
+            lines.append(f"{self.name}_bucket{format_labels(self.labels, key, le='+Inf')} {entry['count']}")
+            lines.append(f"{self.name}_sum{format_labels(self.labels, key)} {entry['sum']}")
+            lines.append(f"{self.name}_count{format_labels(self.labels, key)} {entry['count']}")
+        return lines
+
+
+def render() -> str:
+    """
+    Every registered metric in Prometheus text exposition format.
+    """
+    lines = []
+    with _lock:
+        for metric in _registry:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# ---------------------------------------
+# Metrics
+# ---------------------------------------
+
+stage_seconds = Histogram(
+    "pipeline_stage_duration_seconds",
+    "Wall time of each agent stage.",
+    ("stage", "outcome"),
+)
+llm_seconds = Histogram(
+    "llm_request_duration_seconds",
+    "Wall time of each LLM request attempt.",
+    ("agent", "mode"),
+)
+llm_tokens = Counter(
+    "llm_tokens_total",
+    "Tokens reported by the API, by kind (input/output/cache_read/cache_creation).",
+    ("agent", "kind"),
+)
+llm_retries = Counter("llm_retries_total", "LLM attempts retried after a transient error.", ("agent",))
+llm_errors = Counter("llm_errors_total", "LLM requests that failed for good.", ("agent",))
+llm_repairs = Counter("llm_repair_calls_total", "Extra LLM calls made to repair unparseable output.", ("agent",))
+agent3_attempts = Counter("agent3_llm_attempts_total", "Agent3 LLM fallback loop iterations.")
+llm_hedges = Counter("llm_hedges_total", "Hedged LLM calls: sent, and whether the hedge won or lost.", ("agent", "result"))
+llm_store_requests = Counter("llm_store_requests_total", "Response-store lookups by result.", ("result",))
+route_requests = Counter("llm_route_requests_total", "LLM calls by route and model.", ("route", "model"))
+route_escalations = Counter("llm_route_escalations_total", "Calls re-run on the strong model after failing validation.", ("route",))
+route_seconds = Histogram("llm_route_duration_seconds", "Latency per route and model.", ("route", "model"))
+breaker_rejections = Counter("circuit_breaker_rejections_total", "Calls failed fast by an open circuit.", ("name",))
+breaker_transitions = Counter("circuit_breaker_transitions_total", "Circuit breaker state changes.", ("name", "state"))
+stage_degraded = Counter("stage_degraded_total", "Stages that returned a fallback after an upstream failure.", ("stage", "reason"))
+singleflight_shared = Counter("singleflight_shared_total", "Calls that joined an identical in-flight call.", ("name",))
+cache_requests = Counter("cache_requests_total", "Cache lookups by namespace and result.", ("namespace", "result"))
+
+
+# ---------------------------------------
+# Instrumentation helpers
+# ---------------------------------------
+
+def instrument(stage: str):
+    """
+    Decorator for an agent's async entry point: tags nested LLM calls with
+    the agent name and records the stage duration (and adds it to the
+    request's Server-Timing, if one is being collected).
+    """
+
+    def wrap(fn):
+        @functools.wraps(fn)
+        async def run(*args, **kwargs):
+            token = current_agent.set(stage)
+            started = time.perf_counter()
+            outcome = "ok"
+            try:
+                return await fn(*args, **kwargs)
+            except asyncio.CancelledError:
+                outcome = "cancelled"
+                raise
+            except Exception:
+                outcome = "error"
+                raise
+            finally:
+                elapsed = time.perf_counter() - started
+                stage_seconds.observe(elapsed, stage=stage, outcome=outcome)
+                timings = request_timings.get()
+                if timings is not None and outcome != "cancelled":
+                    timings[stage] = timings.get(stage, 0.0) + elapsed
+                current_agent.reset(token)
+
+        return run
+
+    return wrap
+
+
+def server_timing(timings: dict) -> str:
+    return ", ".join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in timings.items())
@@ -0,0 +1,321 @@
+import time
+import asyncio
+from agents.agent0 import agent0_async
+from agents.agent1 import agent1_async, cache_key as agent1_key
+from agents.agent2 import agent2_async
+from agents.agent3 import agent3_async
+from agents.aiResearcher import agent4_async
+from agents import resilience
+
+# ---------------------------------------
+# Stages
+# ---------------------------------------
+
+class Stage:
+    """
+    One node of the pipeline DAG. `inputs` names the stages whose outputs it
+    needs; run(inputs, partial) gets {"text": ..., <input>: <output>, ...}.
+
+    A stage with `speculate` may call partial(output) with a provisional
+    output; once speculate(output) returns a key, its dependents start on
+    that output. They are kept only if the final output has the same key,
+    so the key must cover every field they read. Dependents that read
+    more than the key covers set `speculative=False` and always wait for
+    the final output.
+    """
+
+    def __init__(self, inputs: tuple, run, speculate=None, speculative: bool = True):
+        self.inputs = inputs
+        self.run = run
+        self.speculate = speculate
+        self.speculative = speculative
+
+
+def speculation_key(patient: dict):
+    # agent1 (and through it agent2) and agent4 read only these fields
+    return agent1_key(patient)
+
+
+async def run_agent0(inputs: dict, partial) -> dict:
+    def on_field(name: str, fields: dict):
+        if name == "diagnosis" and (fields.get("diagnosis") or "").strip():
+            partial(fields)
+
+    return await agent0_async(inputs["text"], on_field=on_field)
+
+
+async def run_agent1(inputs: dict, partial) -> dict:
+    return await agent1_async(inputs["agent0"])
+
+
+async def run_agent2(inputs: dict, partial) -> dict:
+    return await agent2_async(inputs["agent1"])
+
+
+async def run_agent3(inputs: dict, partial) -> dict:
+    # Filters agent1's candidates against agent0's patient data
+    suggested = inputs["agent1"].get("candidate_treatments", [])
+    return await agent3_async({**inputs["agent0"], "suggested_meds": suggested})
+
+
+async def run_agent4(inputs: dict, partial) -> dict:
+    # Only needs the diagnosis
+    return await agent4_async(inputs["agent0"].get("diagnosis") or "")
+
+
+STAGES = {
+    "agent0": Stage((), run_agent0, speculate=speculation_key),
+    "agent1": Stage(("agent0",), run_agent1),
+    "agent2": Stage(("agent1",), run_agent2),
+    # Reads allergies and conditions, which agent0 may still be extracting
+    "agent3": Stage(("agent0", "agent1"), run_agent3, speculative=False),
+    "agent4": Stage(("agent0",), run_agent4),
+}
+
+DEFAULT_STAGES = ("agent0", "agent1", "agent2")
+ALL_STAGES = tuple(STAGES)
+
+
+# ---------------------------------------
+# Stage selection
+# ---------------------------------------
+
+def resolve_stages(stages=None) -> set:
+    """
+    Requested stages plus everything they depend on. Unknown names raise
+    ValueError.
+    """
+    requested = list(stages or DEFAULT_STAGES)
+    unknown = [s for s in requested if s not in STAGES]
+    if unknown:
+        raise ValueError(f"Unknown stages: {', '.join(unknown)}")
+
+    resolved = set()
+    while requested:
+        stage = requested.pop()
+        if stage not in resolved:
+            resolved.add(stage)
+            requested.extend(STAGES[stage].inputs)
+    return resolved
+
+
+def topological(stages: set) -> list:
+    """
+    `stages` ordered so every stage comes after its inputs.
+    """
+    ordered = []
+
+    def visit(name: str):
+        if name in ordered:
+            return
+        for dependency in STAGES[name].inputs:
+            visit(dependency)
+        ordered.append(name)
+
+    for name in STAGES:
+        if name in stages:
+            visit(name)
+    return ordered
+
+
+def descendants(stage: str, order: list) -> list:
+    """
+    Stages in `order` that (transitively) consume `stage`'s output.
+    """
+    found = {stage}
+    for name in order:
+        if any(dependency in found for dependency in STAGES[name].inputs):
+            found.add(name)
+    return [name for name in order if name in found and name != stage]
+
+
+# ---------------------------------------
+# DAG executor
+# ---------------------------------------
+
+async def iter_pipeline(text: str, stages=None, deadline: float = None, degraded: dict = None):
+    """
+    Run the enabled stages and yield each one's result the moment it is
+    ready:
+
+        {"stage": "agent1", "output": {...}, "started_ms": 402.1, "elapsed_ms": 812.4}
+
+    Each stage starts as soon as its inputs are done, so independent stages
+    (agent2, agent3, agent4) run concurrently and wall time is the critical
+    path. Speculative dependents of agent0 start once it has streamed the
+    diagnosis; see Stage.
+
+    Every upstream call shares one `deadline` (seconds, default
+    REQUEST_DEADLINE). A stage that loses its upstream returns a fallback
+    and its event carries "degraded": reason; `degraded` collects them.
+    """
+
+    order = topological(resolve_stages(stages))
+    queue = asyncio.Queue()
+    started = time.perf_counter()
+    tasks = []
+    starts = {}
+    degraded = {} if degraded is None else degraded
+
+    # Outputs or tasks by stage name, for the non-speculative graph
+    sources = {}
+    # Per speculating stage: {"key": ..., "tasks": {stage: task}}
+    speculative = {}
+    # Stages whose start waits on a speculating ancestor's output
+    deferred = {name for stage in order if STAGES[stage].speculate for name in descendants(stage, order)}
+
+    def ms() -> float:
+        return round((time.perf_counter() - started) * 1000, 1)
+
+    def emit(stage: str, output):
+        event = {"stage": stage, "output": output, "started_ms": starts.get(stage), "elapsed_ms": ms()}
+        if stage in degraded:
+            event["degraded"] = degraded[stage]
+        queue.put_nowait(event)
+
+    async def run_stage(name: str, inputs: dict):
+        ready = {"text": text}
+        for dependency, source in inputs.items():
+            ready[dependency] = await source if isinstance(source, asyncio.Future) else source
+        starts[name] = ms()
+        return await STAGES[name].run(ready, lambda output: on_partial(name, output))
+
+    def launch(names: list, outputs: dict) -> dict:
+        """
+        Start `names` in order, each awaiting its inputs from `outputs`
+        (values or tasks); the new tasks are added to `outputs`.
+        """
+        launched = {}
+        for name in names:
+            inputs = {dependency: outputs[dependency] for dependency in STAGES[name].inputs}
+            task = asyncio.create_task(run_stage(name, inputs))
+            tasks.append(task)
+            outputs[name] = launched[name] = task
+        return launched
+
+    def on_partial(name: str, output):
+        stage = STAGES[name]
+        # Only stages outside every speculative subgraph may speculate
+        if stage.speculate is None or name in speculative or name in deferred:
+            return
+        key = stage.speculate(output)
+        if key is None:
+            return
+        # Skip stages that opt out, and anything downstream of them
+        downstream = descendants(name, order)
+        eligible = {name}
+        for dependant in downstream:
+            inputs = STAGES[dependant].inputs
+            if STAGES[dependant].speculative and all(d in eligible or d not in downstream for d in inputs):
+                eligible.add(dependant)
+        speculative[name] = {
+            "key": key,
+            "tasks": launch([d for d in downstream if d in eligible], {**sources, name: output}),
+        }
+
+    async def finish(name: str, task):
+        output = await task
+        emit(name, output)
+
+        stage = STAGES[name]
+        if stage.speculate is None or name in deferred:
+            return
+        guess = speculative.get(name)
+        sources[name] = output
+        if guess is not None and guess["key"] == stage.speculate(output):
+            # Keep the speculative tasks; start whatever had to wait
+            downstream = dict(guess["tasks"])
+            waiting = [d for d in descendants(name, order) if d not in downstream]
+            downstream.update(launch(waiting, {**sources, **downstream}))
+        else:
+            # Speculation missed (or never started) — discard it and rerun
+            for pending in (guess or {}).get("tasks", {}).values():
+                pending.cancel()
+            downstream = launch(descendants(name, order), dict(sources))
+        sources.update(downstream)
+        await asyncio.gather(*(finish(stage_name, t) for stage_name, t in downstream.items()))
+
+    async def drive():
+        # Set inside the driver task, so every stage task inherits it
+        resilience.start(resilience.REQUEST_DEADLINE if deadline is None else deadline, degraded)
+
+        launched = launch([name for name in order if name not in deferred], sources)
+        await asyncio.gather(*(finish(name, task) for name, task in launched.items()))
+
+    driver = asyncio.create_task(drive())
+    driver.add_done_callback(lambda _: queue.put_nowait(None))
+
+    try:
+        while True:
+            event = await queue.get()
+            if event is None:
+                break
+            yield event
+        # Re-raise whatever stopped the driver
+        await driver
+    finally:
+        driver.cancel()
+        for task in tasks:
+            task.cancel()
+
+
+async def run_pipeline(text: str, stages=None, deadline: float = None) -> dict:
+    """
+    Non-streaming form: {"agent0_output": ..., "agent1_output": ..., ...},
+    plus {"degraded": {stage: reason}} if any stage fell back.
+    """
+    result = {}
+    degraded = {}
+    async for event in iter_pipeline(text, stages, deadline, degraded):
+        result[f"{event['stage']}_output"] = event["output"]
+    if degraded:
+        result["degraded"] = degraded
+    return result
+
+
+# ---------------------------------------
+# Batch
+# ---------------------------------------
+
+async def iter_batch(notes: list, concurrency: int = 8, stages=None):
+    """
+    Run the pipeline over many notes with at most `concurrency` in flight.
+    Yields results in completion order, each tagged with its input index:
+
+        {"index": 3, "result": {...}}   or   {"index": 3, "error": "..."}
+
+    A failing note never stops the rest of the batch. A note that is an
+    exception (e.g. an unparseable NDJSON line) is reported as its error.
+    """
+
+    queue = asyncio.Queue()
+    results = asyncio.Queue()
+
+    for index, note in enumerate(notes):
+        queue.put_nowait((index, note))
+
+    async def worker():
+        while True:
+            try:
+                index, note = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            try:
+                if isinstance(note, Exception):
+                    raise note
+                if isinstance(note, dict):
+                    note = note.get("text")
+                if not isinstance(note, str):
+                    raise ValueError("note must be a string or an object with a \"text\" field")
+                results.put_nowait({"index": index, "result": await run_pipeline(note, stages)})
+            except Exception as err:
+                results.put_nowait({"index": index, "error": str(err) or type(err).__name__})
+
+    workers = [asyncio.create_task(worker()) for _ in range(max(1, min(concurrency, len(notes))))]
+
+    try:
+        for _ in range(len(notes)):
+            yield await results.get()
+    finally:
+        for task in workers:
+            task.cancel()
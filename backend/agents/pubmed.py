@@ -0,0 +1,197 @@
+import os
+import time
+import asyncio
+import weakref
+import httpx
+from agents.cache import TieredCache, make_key, normalize_text
+from agents.batcher import MicroBatcher
+from agents import resilience
+
+# ---------------------------------------
+# Initialization
+# ---------------------------------------
+
+PUBMED_BASE_URL = os.getenv("PUBMED_BASE_URL", "https://eutils.ncbi.nlm.nih.gov/entrez/eutils")
+NCBI_API_KEY = os.getenv("NCBI_API_KEY")
+
+# NCBI allows 3 requests/second per IP without an API key, 10 with one
+PUBMED_RATE_LIMIT = float(os.getenv("PUBMED_RATE_LIMIT", "10" if NCBI_API_KEY else "3"))
+PUBMED_CACHE_TTL = float(os.getenv("PUBMED_CACHE_TTL", str(7 * 24 * 3600)))
+PUBMED_TIMEOUT = float(os.getenv("PUBMED_TIMEOUT", "10"))
+PUBMED_MAX_RETRIES = int(os.getenv("PUBMED_MAX_RETRIES", "2"))
+
+# esummary takes comma-separated IDs; NCBI recommends <= 200 per GET
+SUMMARY_BATCH_SIZE = 200
+SUMMARY_BATCH_WINDOW = float(os.getenv("PUBMED_BATCH_WINDOW_MS", "50")) / 1000
+
+
+class RateLimiter:
+    """
+    Spaces requests at least 1/rate seconds apart across all callers.
+    """
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0
+        self._next = 0.0
+
+    async def acquire(self):
+        now = time.monotonic()
+        slot = max(now, self._next)
+        self._next = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+def is_retryable(err: Exception) -> bool:
+    if isinstance(err, httpx.HTTPStatusError):
+        return err.response.status_code == 429 or err.response.status_code >= 500
+    return isinstance(err, httpx.TransportError)
+
+
+# ---------------------------------------
+# PubMed Client
+# ---------------------------------------
+
+class PubMedClient:
+    """
+    Async E-utilities client: one keep-alive pool, NCBI rate limiting,
+    on-disk caching of esearch/esummary, and esummary lookups batched across
+    concurrent searches. Point base_url at a local stand-in server to test.
+    """
+
+    def __init__(
+        self,
+        base_url: str = PUBMED_BASE_URL,
+        api_key: str = NCBI_API_KEY,
+        rate: float = PUBMED_RATE_LIMIT,
+        cache: TieredCache = None,
+        batch_window: float = SUMMARY_BATCH_WINDOW,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self.limiter = RateLimiter(rate)
+        self.cache = cache if cache is not None else TieredCache("pubmed", ttl=PUBMED_CACHE_TTL)
+        self.summaries = MicroBatcher(
+            self._fetch_summaries,
+            self._fetch_summary,
+            window=batch_window,
+            max_items=SUMMARY_BATCH_SIZE,
+        )
+        # httpx pools are bound to the loop that created them
+        self._http = weakref.WeakKeyDictionary()
+
+    def http(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        client = self._http.get(loop)
+        if client is None:
+            client = httpx.AsyncClient(
+                timeout=PUBMED_TIMEOUT,
+                limits=httpx.Limits(max_connections=10, max_keepalive_connections=5),
+            )
+            self._http[loop] = client
+        return client
+
+    async def get(self, endpoint: str, params: dict) -> dict:
+        params = dict(params, retmode="json")
+        if self.api_key:
+            params["api_key"] = self.api_key
+
+        breaker = resilience.get_breaker("pubmed")
+        attempt = 0
+        while True:
+            breaker.allow()
+            await self.limiter.acquire()
+            try:
+                resp = await self.http().get(
+                    f"{self.base_url}/{endpoint}",
+                    params=params,
+                    timeout=resilience.timeout(PUBMED_TIMEOUT),
+                )
+                resp.raise_for_status()
+                breaker.record(True)
+                return resp.json()
+            except (httpx.TransportError, httpx.HTTPStatusError) as err:
+                breaker.record(not is_retryable(err))
+                if attempt >= PUBMED_MAX_RETRIES or not is_retryable(err):
+                    raise
+                await resilience.sleep(resilience.backoff(attempt, 0.5))
+                attempt += 1
+
+    async def esearch(self, term: str, retmax: int = 10) -> list:
+        key = make_key("esearch", normalize_text(term), retmax)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+
+        resp = await self.get("esearch.fcgi", {"db": "pubmed", "term": term, "retmax": str(retmax)})
+        ids = resp.get("esearchresult", {}).get("idlist", [])
+        self.cache.set(key, ids)
+        return ids
+
+    async def esummary(self, ids: list) -> dict:
+        """
+        {pmid: summary} for every ID we could resolve. Cached IDs are served
+        locally; the rest join whatever batch is currently forming.
+        """
+        summaries = {}
+        missing = []
+        for pid in ids:
+            cached = self.cache.get(make_key("esummary", pid))
+            if cached is not None:
+                summaries[pid] = cached
+            else:
+                missing.append(pid)
+
+        fetched = await asyncio.gather(*(self.summaries.submit(pid) for pid in missing))
+        for pid, summary in zip(missing, fetched):
+            if summary:
+                summaries[pid] = summary
+        return summaries
+
+    async def _fetch_summaries(self, ids: list) -> list:
+        unique = list(dict.fromkeys(ids))
+        resp = await self.get("esummary.fcgi", {"db": "pubmed", "id": ",".join(unique)})
+        result = resp.get("result", {})
+
+        out = []
+        for pid in ids:
+            summary = result.get(pid) or {}
+            if summary:
+                self.cache.set(make_key("esummary", pid), summary)
+            out.append(summary)
+        return out
+
+    async def _fetch_summary(self, pid: str) -> dict:
+        return (await self._fetch_summaries([pid]))[0]
+
+    async def search(self, diagnosis: str, retmax: int = 10) -> list:
+        """
+        [{"title": ..., "url": ...}] for the top PubMed hits, or [] on any
+        upstream failure. An open circuit or spent deadline is raised so
+        the caller can report it.
+        """
+        try:
+            ids = await self.esearch(diagnosis, retmax)
+            if not ids:
+                return []
+            summaries = await self.esummary(ids)
+        except (httpx.HTTPError, ValueError):
+            return []
+
+        papers = []
+        for pid in ids:
+            data = summaries.get(pid)
+            if not data:
+                continue
+            papers.append({"title": data.get("title", ""), "url": f"https://pubmed.ncbi.nlm.nih.gov/{pid}/"})
+        return papers
+
+
+_client = None
+
+
+def get_pubmed() -> PubMedClient:
+    global _client
+    if _client is None:
+        _client = PubMedClient()
+    return _client
@@ -0,0 +1,254 @@
+import os
+import time
+import random
+import asyncio
+import logging
+import threading
+import contextvars
+from collections import deque
+from contextvars import ContextVar
+import httpx
+from anthropic import APIError
+from agents import metrics
+
+logger = logging.getLogger(__name__)
+
+# ---------------------------------------
+# Initialization
+# ---------------------------------------
+
+# End-to-end budget for one /analyze request; 0 disables it
+REQUEST_DEADLINE = float(os.getenv("REQUEST_DEADLINE_SECONDS", "30"))
+
+# Retry backoff is "full jitter": a uniform delay up to base * 2^attempt,
+# capped, so synchronized clients don't retry in lockstep
+RETRY_MAX_DELAY = float(os.getenv("RETRY_MAX_DELAY", "4"))
+
+# Open a circuit when at least BREAKER_MIN_CALLS calls in the last
+# BREAKER_WINDOW seconds failed at BREAKER_ERROR_RATE or more; probe again
+# after BREAKER_COOLDOWN seconds
+BREAKER_WINDOW = float(os.getenv("BREAKER_WINDOW", "30"))
+BREAKER_MIN_CALLS = int(os.getenv("BREAKER_MIN_CALLS", "10"))
+BREAKER_ERROR_RATE = float(os.getenv("BREAKER_ERROR_RATE", "0.5"))
+BREAKER_COOLDOWN = float(os.getenv("BREAKER_COOLDOWN", "15"))
+
+# Absolute time.monotonic() by which the current request must finish
+_deadline = ContextVar("deadline", default=None)
+
+# Per-request {stage: reason} for stages that fell back to partial results
+_degraded = ContextVar("degraded", default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    """
+    The request's deadline passed before (or while) an upstream call ran.
+    """
+
+
+class CircuitOpen(RuntimeError):
+    """
+    The upstream's circuit is open; the call was not attempted.
+    """
+
+
+# ---------------------------------------
+# Deadlines
+# ---------------------------------------
+
+def start(seconds: float = REQUEST_DEADLINE, degraded: dict = None):
+    """
+    Begin a request budget in the current context. Tasks created afterwards
+    inherit it. `degraded` collects {stage: reason} for the request.
+    """
+    _deadline.set(time.monotonic() + seconds if seconds and seconds > 0 else None)
+    _degraded.set(degraded)
+
+
+def detached() -> contextvars.Context:
+    """
+    A copy of the current context with no request attached (no deadline,
+    degraded results or timings), for work shared by several requests.
+    Each waiter bounds its own wait with within().
+    """
+    context = contextvars.copy_context()
+    context.run(start, 0, None)
+    context.run(metrics.request_timings.set, None)
+    return context
+
+
+def remaining():
+    """
+    Seconds left in the current request's budget, or None if unbounded.
+    """
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def check():
+    left = remaining()
+    if left is not None and left <= 0:
+        raise DeadlineExceeded("request deadline exceeded")
+
+
+def timeout(cap: float) -> float:
+    """
+    The timeout for one upstream call: `cap`, or less if the budget is
+    nearly spent. Raises DeadlineExceeded if it is already spent.
+    """
+    check()
+    left = remaining()
+    return cap if left is None else min(cap, left)
+
+
+async def within(awaitable):
+    """
+    Await `awaitable`, giving up with DeadlineExceeded when the budget runs
+    out.
+    """
+    left = remaining()
+    if left is None:
+        return await awaitable
+    if left <= 0:
+        if asyncio.iscoroutine(awaitable):
+            awaitable.close()
+        raise DeadlineExceeded("request deadline exceeded")
+    try:
+        return await asyncio.wait_for(awaitable, left)
+    except TimeoutError:
+        raise DeadlineExceeded("request deadline exceeded") from None
+
+
+def backoff(attempt: int, base: float) -> float:
+    return random.uniform(0, min(RETRY_MAX_DELAY, base * (2 ** attempt)))
+
+
+async def sleep(delay: float):
+    """
+    asyncio.sleep that refuses to outlive the deadline: if the retry could
+    not start in time, fail now instead of after sleeping.
+    """
+    left = remaining()
+    if left is not None and delay >= left:
+        raise DeadlineExceeded("no budget left to retry")
+    await asyncio.sleep(delay)
+
+
+# ---------------------------------------
+# Circuit breaker
+# ---------------------------------------
+
+class CircuitBreaker:
+    """
+    closed -> open when the recent error rate spikes; open -> half-open
+    after a cooldown, letting one probe through; the probe's outcome closes
+    or re-opens it. While open, allow() raises CircuitOpen immediately.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        window: float = BREAKER_WINDOW,
+        min_calls: int = BREAKER_MIN_CALLS,
+        error_rate: float = BREAKER_ERROR_RATE,
+        cooldown: float = BREAKER_COOLDOWN,
+    ):
+        self.name = name
+        self.window = window
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.cooldown = cooldown
+        self.state = "closed"
+        self._outcomes = deque()
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_at = None
+        self._lock = threading.Lock()
+
+    def _transition(self, state: str):
+        self.state = state
+        metrics.breaker_transitions.inc(name=self.name, state=state)
+        logger.warning("circuit %s is %s", self.name, state)
+
+    def allow(self):
+        with self._lock:
+            now = time.monotonic()
+            if self.state == "open" and now - self._opened_at >= self.cooldown:
+                self._transition("half_open")
+            if self.state == "half_open":
+                # One probe at a time; a probe that never reports back (e.g.
+                # cancelled) is replaced after another cooldown
+                if self._probe_at is None or now - self._probe_at >= self.cooldown:
+                    self._probe_at = now
+                    return
+            elif self.state == "closed":
+                return
+        metrics.breaker_rejections.inc(name=self.name)
+        raise CircuitOpen(f"{self.name} circuit is open")
+
+    def record(self, ok: bool):
+        with self._lock:
+            now = time.monotonic()
+            if self.state == "half_open":
+                self._probe_at = None
+                if ok:
+                    self._outcomes.clear()
+                    self._failures = 0
+                    self._transition("closed")
+                else:
+                    self._opened_at = now
+                    self._transition("open")
+                return
+            if self.state == "open":
+                return
+
+            self._outcomes.append((now, ok))
+            self._failures += not ok
+            while self._outcomes and now - self._outcomes[0][0] > self.window:
+                _, old_ok = self._outcomes.popleft()
+                self._failures -= not old_ok
+
+            calls = len(self._outcomes)
+            if calls >= self.min_calls and self._failures / calls >= self.error_rate:
+                self._opened_at = now
+                self._transition("open")
+
+    def release(self):
+        """
+        The call ended without telling us anything about the upstream (e.g.
+        its request ran out of budget); free the probe slot, record nothing.
+        """
+        with self._lock:
+            if self.state == "half_open":
+                self._probe_at = None
+
+
+_breakers = {}
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    breaker = _breakers.get(name)
+    if breaker is None:
+        breaker = _breakers.setdefault(name, CircuitBreaker(name))
+    return breaker
+
+
+# ---------------------------------------
+# Degraded results
+# ---------------------------------------
+
+# Failures a stage answers with a fallback instead of failing the request
+UPSTREAM_ERRORS = (DeadlineExceeded, CircuitOpen, APIError, httpx.HTTPError)
+
+
+def degrade(stage: str, err: Exception):
+    """
+    Record that `stage` is returning a partial result because of `err`.
+    """
+    reason = {DeadlineExceeded: "deadline", CircuitOpen: "circuit_open"}.get(type(err), "upstream_error")
+    logger.warning("%s degraded (%s): %s", stage, reason, err)
+    metrics.stage_degraded.inc(stage=stage, reason=reason)
+    degraded = _degraded.get()
+    if degraded is not None:
+        degraded[stage] = reason
@@ -0,0 +1,106 @@
+import os
+import time
+from agents.llm import DEFAULT_MODEL
+from agents import metrics
+
+# ---------------------------------------
+# Initialization
+# ---------------------------------------
+
+# Two tiers: every route starts on FAST unless its features say otherwise,
+# and escalates to STRONG only when the answer fails validation
+FAST_MODEL = os.getenv("LLM_MODEL_FAST", DEFAULT_MODEL)
+STRONG_MODEL = os.getenv("LLM_MODEL_STRONG", "claude-3-5-sonnet-latest")
+
+# Notes longer than this go straight to the strong model
+LONG_NOTE_CHARS = int(os.getenv("ROUTER_LONG_NOTE_CHARS", "8000"))
+# Token budgets scale with the work requested, capped here
+MAX_TOKENS_CAP = int(os.getenv("ROUTER_MAX_TOKENS_CAP", "4000"))
+
+
+def budget(base: int, per_item: int, items: int) -> int:
+    return min(MAX_TOKENS_CAP, base + per_item * max(0, items))
+
+
+def make_route(name: str, model: str, max_tokens: int) -> dict:
+    return {"name": name, "model": model, "max_tokens": max_tokens}
+
+
+# ---------------------------------------
+# Routing
+# ---------------------------------------
+
+def route(agent: str, **features) -> dict:
+    """
+    {"name", "model", "max_tokens"} for one call, from input features:
+
+        agent0: note_chars, fields
+        agent1: (none)
+        agent2: drugs, links (whether the call also returns Links)
+        agent3: meds
+        agent4: papers
+    """
+    if agent == "agent0":
+        fields = features.get("fields", 8)
+        if features.get("note_chars", 0) > LONG_NOTE_CHARS:
+            return make_route("agent0.long", STRONG_MODEL, budget(200, 100, fields))
+        return make_route("agent0.short", FAST_MODEL, budget(200, 100, fields))
+
+    if agent == "agent1":
+        # Repeat diagnoses are answered from the candidate cache, so what
+        # reaches the model is mostly new; start cheap and let
+        # with_escalation retry an empty answer on the strong model
+        return make_route("agent1", FAST_MODEL, 400)
+
+    if agent == "agent2":
+        # ~60 tokens per verdict, plus ~400 for the Links block
+        drugs = features.get("drugs", 0)
+        if not drugs:
+            return make_route("agent2.links", FAST_MODEL, 600)
+        base = 600 if features.get("links", True) else 200
+        return make_route("agent2.verdicts", FAST_MODEL, budget(base, 60, drugs))
+
+    if agent == "agent3":
+        return make_route("agent3", FAST_MODEL, budget(200, 80, features.get("meds", 0)))
+
+    if agent == "agent4":
+        return make_route("agent4", FAST_MODEL, budget(200, 100, min(5, features.get("papers", 5))))
+
+    return make_route(agent, FAST_MODEL, 1000)
+
+
+def escalate(current: dict):
+    """
+    The next route up, or None if `current` is already on the strong model.
+    """
+    if current["model"] == STRONG_MODEL:
+        return None
+    metrics.route_escalations.inc(route=current["name"])
+    return make_route(current["name"], STRONG_MODEL, min(MAX_TOKENS_CAP, int(current["max_tokens"] * 1.5)))
+
+
+async def timed(current: dict, call):
+    """
+    Await call(route), recording per-route latency.
+    """
+    metrics.route_requests.inc(route=current["name"], model=current["model"])
+    started = time.perf_counter()
+    try:
+        return await call(current)
+    finally:
+        metrics.route_seconds.observe(time.perf_counter() - started, route=current["name"], model=current["model"])
+
+
+async def with_escalation(current: dict, call, valid):
+    """
+    call(route) on `current`; if valid(result) is False, once more on the
+    escalated route. Returns the last result, valid or not.
+    """
+    result = await timed(current, call)
+    if valid(result):
+        return result
+
+    stronger = escalate(current)
+    if stronger is None:
+        return result
+    return await timed(stronger, call)
@@ -0,0 +1,153 @@
+import os
+import json
+import time
+import threading
+from pathlib import Path
+from agents.cache import normalize_text
+from agents.diagnoses import get_index
+
+# ---------------------------------------
+# Initialization
+# ---------------------------------------
+
+STATIC_PATH = Path(__file__).resolve().parent.parent / "static"
+
+# How often (seconds) to stat the rule files for changes
+RULES_CHECK_INTERVAL = float(os.getenv("RULES_CHECK_INTERVAL", "2"))
+
+# Guidelines recommend these too, but they are never a valid *drug*
+SUPPORTIVE_CARE = {
+    "rest", "bed rest", "sleep", "hydration", "oral hydration", "fluids", "oral fluids",
+    "humidifier", "humidified air", "steam inhalation", "saline nasal irrigation", "saline spray",
+    "saline gargles", "salt water gargles", "gargling", "honey", "lozenges", "warm compresses",
+    "cold compresses", "ice", "heat", "elevation", "compression", "physical therapy", "exercise",
+    "diet", "weight loss", "smoking cessation", "supportive care", "symptomatic treatment",
+    "watchful waiting", "observation", "reassurance", "education",
+}
+
+
+# ---------------------------------------
+# Indexed snapshot
+# ---------------------------------------
+
+class RulesSnapshot:
+    """
+    Immutable index over guidelines.json and outdated_meds.json:
+    canonical diagnosis ID -> normalized drug -> "valid" / "invalid".
+
+    Precedence: outdated > not_recommended > recommended. Supportive care
+    listed as recommended ("rest", "hydration") is skipped: it is never a
+    valid drug, so it is left to the model.
+    """
+
+    def __init__(self, guidelines: dict, outdated: dict):
+        self.index = get_index()
+        self.index_version = self.index.version
+        self.outdated = {}
+        self.verdicts = {}
+
+        for diagnosis, rules in (guidelines or {}).items():
+            index = self.verdicts.setdefault(self.key(diagnosis), {})
+            for drug in rules.get("recommended", []):
+                if normalize_text(drug) not in SUPPORTIVE_CARE:
+                    index[normalize_text(drug)] = "valid"
+            for drug in rules.get("not_recommended", []):
+                index[normalize_text(drug)] = "invalid"
+
+        for diagnosis, drugs in (outdated or {}).items():
+            key = self.key(diagnosis)
+            self.outdated[key] = {normalize_text(d) for d in drugs}
+            index = self.verdicts.setdefault(key, {})
+            for drug in drugs:
+                index[normalize_text(drug)] = "invalid"
+
+    def key(self, diagnosis: str) -> str:
+        return self.index.canonical_id(diagnosis)
+
+    def verdict(self, diagnosis: str, drug: str):
+        return self.verdicts.get(self.key(diagnosis), {}).get(normalize_text(drug))
+
+    def outdated_for(self, diagnosis: str) -> set:
+        return self.outdated.get(self.key(diagnosis), set())
+
+    def diagnoses(self) -> list:
+        return list(self.verdicts)
+
+
+# ---------------------------------------
+# Hot-reloading store
+# ---------------------------------------
+
+class RulesStore:
+    """
+    Loads the rule files once and rebuilds the snapshot when their mtime
+    changes, or when the diagnosis index gains entries (which can re-key
+    them). Readers always see a complete snapshot: the new one is built
+    on the side and swapped in with a single assignment. A file that fails
+    to parse (e.g. caught mid-write) keeps the previous snapshot.
+    """
+
+    def __init__(
+        self,
+        guidelines_path: Path = STATIC_PATH / "guidelines.json",
+        outdated_path: Path = STATIC_PATH / "outdated_meds.json",
+        check_interval: float = RULES_CHECK_INTERVAL,
+    ):
+        self.guidelines_path = Path(guidelines_path)
+        self.outdated_path = Path(outdated_path)
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._stamp = None
+        self._checked_at = 0.0
+        self._snapshot = RulesSnapshot({}, {})
+        self.reload()
+
+    def _file_stamp(self):
+        stamp = []
+        for path in (self.guidelines_path, self.outdated_path):
+            try:
+                st = path.stat()
+                stamp.append((st.st_mtime_ns, st.st_size))
+            except FileNotFoundError:
+                stamp.append(None)
+        return tuple(stamp)
+
+    @staticmethod
+    def _read(path: Path) -> dict:
+        if not path.exists():
+            return {}
+        with open(path, "r") as f:
+            return json.load(f)
+
+    def reload(self) -> bool:
+        """
+        Rebuild if the files changed. Returns True if a new snapshot was
+        swapped in.
+        """
+        with self._lock:
+            self._checked_at = time.monotonic()
+            stamp = self._file_stamp() + (get_index().version,)
+            if stamp == self._stamp:
+                return False
+            try:
+                snapshot = RulesSnapshot(self._read(self.guidelines_path), self._read(self.outdated_path))
+            except (ValueError, OSError, AttributeError):
+                return False
+            self._snapshot = snapshot
+            self._stamp = stamp
+            return True
+
+    def snapshot(self) -> RulesSnapshot:
+        if time.monotonic() - self._checked_at >= self.check_interval:
+            self.reload()
+        return self._snapshot
+
+
+_store = None
+
+
+def get_rules() -> RulesStore:
+    global _store
+    if _store is None:
+        _store = RulesStore()
+    return _store
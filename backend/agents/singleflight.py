@@ -0,0 +1,47 @@
+import copy
+import asyncio
+import weakref
+from agents import metrics, resilience
+
+# ---------------------------------------
+# Request coalescing
+# ---------------------------------------
+
+class SingleFlight:
+    """
+    Concurrent do(key, fn) calls with the same key share one run of fn():
+    the first caller starts it, later callers wait on the same task, and
+    everyone gets the result (a private deep copy) or the same exception.
+
+    The shared task is shielded, so one caller being cancelled (e.g. a
+    discarded speculative stage) doesn't cancel it for the others. It runs
+    outside any one caller's request (no deadline, timings or degraded
+    results of theirs); each caller waits only as long as its own deadline.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        # Tasks belong to the loop that created them
+        self._calls = weakref.WeakKeyDictionary()
+
+    async def do(self, key: str, fn):
+        loop = asyncio.get_running_loop()
+        calls = self._calls.setdefault(loop, {})
+
+        task = calls.get(key)
+        if task is None:
+            task = loop.create_task(fn(), context=resilience.detached())
+            calls[key] = task
+            task.add_done_callback(lambda done: self._finished(calls, key, done))
+        else:
+            metrics.singleflight_shared.inc(name=self.name)
+
+        result = await resilience.within(asyncio.shield(task))
+        return copy.deepcopy(result)
+
+    @staticmethod
+    def _finished(calls: dict, key: str, task: asyncio.Task):
+        calls.pop(key, None)
+        # Mark the exception retrieved even if every waiter was cancelled
+        if not task.cancelled():
+            task.exception()
@@ -0,0 +1,148 @@
+import os
+import json
+import time
+import asyncio
+import logging
+from pathlib import Path
+import httpx
+from agents.agent1 import agent1_async
+from agents.agent2 import agent2_async
+from agents.aiResearcher import fetch_pubmed_results
+from agents.diagnoses import fetch_diagnosis_rows, get_index
+
+logger = logging.getLogger(__name__)
+
+# ---------------------------------------
+# Initialization
+# ---------------------------------------
+
+STATIC_PATH = Path(__file__).resolve().parent.parent / "static"
+
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "1") == "1"
+WARMUP_TOP_N = int(os.getenv("WARMUP_TOP_N", "20"))
+# Comma-separated diagnoses to warm first (in addition to Supabase/guidelines)
+WARMUP_DIAGNOSES = [d.strip() for d in os.getenv("WARMUP_DIAGNOSES", "").split(",") if d.strip()]
+# Seconds between runs; 0 = only at startup
+WARMUP_INTERVAL = float(os.getenv("WARMUP_INTERVAL", "0"))
+WARMUP_CONCURRENCY = int(os.getenv("WARMUP_CONCURRENCY", "1"))
+# Low priority: hold off while more than this many live requests are running
+WARMUP_MAX_LIVE = int(os.getenv("WARMUP_MAX_LIVE", "4"))
+
+# Representative patient for agent1's (age group, pregnant) cache key
+WARMUP_PATIENT = {"age": 35, "pregnant": False}
+
+
+# ---------------------------------------
+# Warm-up state (reported by /health)
+# ---------------------------------------
+
+state = {
+    "status": "disabled" if not WARMUP_ENABLED else "pending",
+    # Stays True once the first pass has finished, through later passes
+    "ready": not WARMUP_ENABLED,
+    "total": 0,
+    "done": 0,
+    "failed": 0,
+    "started_at": None,
+    "finished_at": None,
+}
+
+
+def is_ready() -> bool:
+    return state["ready"]
+
+
+# ---------------------------------------
+# Diagnosis selection
+# ---------------------------------------
+
+def guideline_diagnoses() -> list:
+    path = STATIC_PATH / "guidelines.json"
+    if not path.exists():
+        return []
+    with open(path, "r") as f:
+        return list(json.load(f))
+
+
+async def top_diagnoses(n: int = WARMUP_TOP_N) -> list:
+    """
+    Up to n distinct diagnoses: the local list, then the Supabase table
+    (most recently updated first — it has no usage counts), then
+    guidelines.json. Duplicates are dropped by canonical ID.
+    """
+    names = list(WARMUP_DIAGNOSES)
+    try:
+        rows = await fetch_diagnosis_rows(select="diagnosis", order="updated_at.desc", limit=str(n))
+        names += [row.get("diagnosis") or "" for row in rows]
+    except (httpx.HTTPError, ValueError) as err:
+        logger.warning("warm-up: supabase diagnoses unavailable: %s", err)
+    names += guideline_diagnoses()
+
+    index = get_index()
+    seen = set()
+    chosen = []
+    for name in names:
+        canonical = index.canonical_id(name)
+        if not canonical or canonical in seen:
+            continue
+        seen.add(canonical)
+        chosen.append(name.strip().lower())
+        if len(chosen) >= n:
+            break
+    return chosen
+
+
+# ---------------------------------------
+# Warm-up job
+# ---------------------------------------
+
+async def warm_diagnosis(diagnosis: str):
+    """
+    Fill the agent1 candidate, agent2 verdict/Links and PubMed search
+    caches for one diagnosis. agent4's summary call isn't cached, so only
+    its PubMed search is warmed.
+    """
+    candidates = await agent1_async({**WARMUP_PATIENT, "diagnosis": diagnosis})
+    await asyncio.gather(
+        agent2_async(candidates),
+        fetch_pubmed_results(diagnosis),
+    )
+
+
+async def run_warmup(busy=lambda: False):
+    """
+    One pass over top_diagnoses(). `busy()` returning True pauses new work
+    so live traffic goes first.
+    """
+    state.update(status="running", done=0, failed=0, started_at=time.time(), finished_at=None)
+    diagnoses = await top_diagnoses()
+    state["total"] = len(diagnoses)
+    semaphore = asyncio.Semaphore(max(1, WARMUP_CONCURRENCY))
+
+    async def warm(diagnosis: str):
+        async with semaphore:
+            while busy():
+                await asyncio.sleep(0.5)
+            try:
+                await warm_diagnosis(diagnosis)
+                state["done"] += 1
+            except Exception as err:
+                state["failed"] += 1
+                logger.warning("warm-up failed for %r: %s", diagnosis, err)
+
+    await asyncio.gather(*(warm(d) for d in diagnoses))
+    state.update(status="done", ready=True, finished_at=time.time())
+    logger.info("warm-up: %d diagnoses warmed, %d failed", state["done"], state["failed"])
+
+
+async def warmup_loop(busy=lambda: False):
+    """
+    Background task: warm at startup, then every WARMUP_INTERVAL seconds.
+    """
+    if not WARMUP_ENABLED:
+        return
+    while True:
+        await run_warmup(busy)
+        if WARMUP_INTERVAL <= 0:
+            return
+        await asyncio.sleep(WARMUP_INTERVAL)
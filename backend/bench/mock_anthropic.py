@@ -0,0 +1,298 @@
+import os
+import re
+import json
+import random
+import asyncio
+import hashlib
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# ---------------------------------------
+# Mock Anthropic Messages API (+ PubMed E-utilities) for offline benchmarks
+# ---------------------------------------
+#
+# Run on its own with
+#     uvicorn bench.mock_anthropic:app --port 8999
+# and point the backend at it with ANTHROPIC_BASE_URL / PUBMED_BASE_URL.
+# bench/run.py does this for you.
+
+# Time to first token: lognormal around the median
+LATENCY_MS = float(os.getenv("MOCK_LATENCY_MS", "400"))
+LATENCY_SIGMA = float(os.getenv("MOCK_LATENCY_SIGMA", "0.5"))
+# Generation time per output token (~4 characters)
+TOKEN_MS = float(os.getenv("MOCK_TOKEN_MS", "2"))
+# Fraction of responses whose JSON is broken beyond local salvage
+MALFORMED_RATE = float(os.getenv("MOCK_MALFORMED_RATE", "0"))
+# Fraction of requests answered with 429, plus an optional in-flight cap
+RATE_LIMIT_RATE = float(os.getenv("MOCK_RATE_LIMIT_RATE", "0"))
+MAX_INFLIGHT = int(os.getenv("MOCK_MAX_INFLIGHT", "0"))
+
+rng = random.Random(int(os.getenv("MOCK_SEED", "1")))
+
+app = FastAPI()
+
+stats = {}
+cached_prefixes = set()
+inflight = 0
+
+
+def reset_stats():
+    stats.clear()
+    stats.update({"messages": 0, "streamed": 0, "rate_limited": 0, "malformed": 0, "pubmed": 0})
+    cached_prefixes.clear()
+
+
+reset_stats()
+
+
+def tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+async def think(output: str):
+    ttft = rng.lognormvariate(0, LATENCY_SIGMA) * LATENCY_MS
+    await asyncio.sleep((ttft + tokens(output) * TOKEN_MS) / 1000)
+
+
+# ---------------------------------------
+# Canned answers
+# ---------------------------------------
+
+CANDIDATES = ["amoxicillin", "doxycycline", "azithromycin", "prednisone", "cefuroxime"]
+
+
+def blocks(body: dict) -> list:
+    """
+    Every text block in the request: system first, then message content.
+    """
+    def as_blocks(value):
+        if isinstance(value, str):
+            return [{"type": "text", "text": value}]
+        return [b for b in value or [] if isinstance(b, dict)]
+
+    found = as_blocks(body.get("system"))
+    for message in body.get("messages", []):
+        found += as_blocks(message.get("content"))
+    return found
+
+
+def request_text(body: dict) -> str:
+    return "\n".join(b.get("text", "") for b in blocks(body))
+
+
+def default_for(schema: dict):
+    kind = schema.get("type")
+    if isinstance(kind, list):
+        kind = kind[0]
+    if "enum" in schema:
+        return schema["enum"][0]
+    if kind == "object":
+        return {k: default_for(v) for k, v in schema.get("properties", {}).items()}
+    if kind == "array":
+        items = schema.get("items", {})
+        return list(items["enum"]) if "enum" in items else []
+    return {"string": "", "integer": 0, "number": 0, "boolean": False}.get(kind)
+
+
+def json_after(label: str, text: str):
+    match = re.search(re.escape(label) + r"\s*(\[.*?\])\s*(?:\n\n|$)", text, re.DOTALL)
+    try:
+        return json.loads(match.group(1)) if match else []
+    except ValueError:
+        return []
+
+
+def answer(body: dict, text: str) -> dict:
+    """
+    A plausible structured answer, shaped by the tool schema when present.
+    """
+    tools = body.get("tools") or []
+    schema = tools[0]["input_schema"] if tools else {}
+    result = default_for(schema) if schema else {}
+
+    if "You are Agent 0" in text:
+        if isinstance(schema.get("additionalProperties"), dict):
+            # Batched extraction: one object per "Patient N text:"
+            patients = len(re.findall(r"Patient \d+ text:", text))
+            result = {str(i): default_for(schema["additionalProperties"]) for i in range(patients)}
+        match = re.search(r"diagnosis[:\s]+([a-z ,-]+)", text.split("Patient text:")[-1], re.IGNORECASE)
+        diagnosis = match.group(1).strip(" ,.") if match else "acute bronchitis"
+        for key in result if isinstance(result, dict) else []:
+            if isinstance(result[key], dict):
+                result[key]["diagnosis"] = diagnosis
+        if "diagnosis" in result:
+            result["diagnosis"] = diagnosis
+        return result
+
+    if "You are Agent 1" in text:
+        # The last "diagnosis" is the patient data; earlier ones are the template
+        found = re.findall(r'"diagnosis":\s*"([^"]*)"', text)
+        count = rng.randint(3, len(CANDIDATES))
+        return {"diagnosis": found[-1] if found else "", "candidate_treatments": CANDIDATES[:count]}
+
+    if "You will classify medications" in text:
+        match = re.search(r'"suggested_meds":\s*(\[.*?\])', text, re.DOTALL)
+        meds = json.loads(match.group(1)) if match else []
+        return {"acceptable_meds": meds, "unacceptable_meds": []}
+
+    if "medical research assistant" in text:
+        drugs = json_after("Drugs to evaluate:", text)
+        return {
+            "valid_drugs": drugs[::2],
+            "invalid_drugs": drugs[1::2],
+            "Links": {"Clinical practice guideline": "https://doi.org/10.0000/mock-guideline"},
+        }
+
+    if "Agent 4" in text:
+        papers = json_after("Papers:", text)
+        match = re.search(r"Diagnosis: (.*)", text)
+        return {"diagnosis": match.group(1).strip() if match else "", "research": papers[:3]}
+
+    return result
+
+
+# ---------------------------------------
+# Messages endpoint
+# ---------------------------------------
+
+def usage(body: dict, text: str, output: str) -> dict:
+    cacheable = [b.get("text", "") for b in blocks(body) if b.get("cache_control")]
+    key = hashlib.sha256("\n".join(cacheable).encode()).hexdigest() if cacheable else None
+    cached = tokens("\n".join(cacheable)) if cacheable else 0
+
+    counts = {
+        "input_tokens": tokens(text) - cached,
+        "output_tokens": tokens(output),
+        "cache_creation_input_tokens": 0,
+        "cache_read_input_tokens": 0,
+    }
+    if key in cached_prefixes:
+        counts["cache_read_input_tokens"] = cached
+    elif key:
+        cached_prefixes.add(key)
+        counts["cache_creation_input_tokens"] = cached
+    return counts
+
+
+def rate_limited() -> JSONResponse:
+    stats["rate_limited"] += 1
+    return JSONResponse(
+        {"type": "error", "error": {"type": "rate_limit_error", "message": "mock rate limit"}},
+        status_code=429,
+        headers={"retry-after": "1"},
+    )
+
+
+def sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.post("/v1/messages")
+async def messages(request: Request):
+    global inflight
+    body = await request.json()
+    stats["messages"] += 1
+
+    if rng.random() < RATE_LIMIT_RATE or (MAX_INFLIGHT and inflight >= MAX_INFLIGHT):
+        return rate_limited()
+
+    text = request_text(body)
+    result = answer(body, text)
+    use_tool = bool(body.get("tools"))
+
+    if rng.random() < MALFORMED_RATE:
+        stats["malformed"] += 1
+        use_tool = False
+        output = json.dumps(result)[: max(1, len(json.dumps(result)) // 2)]
+    else:
+        output = json.dumps(result)
+
+    block = (
+        {"type": "tool_use", "id": "toolu_mock", "name": body["tools"][0]["name"], "input": result}
+        if use_tool else
+        {"type": "text", "text": output}
+    )
+    counts = usage(body, text, output)
+    message = {
+        "id": f"msg_mock_{stats['messages']}",
+        "type": "message",
+        "role": "assistant",
+        "model": body.get("model", "mock"),
+        "stop_reason": "tool_use" if use_tool else "end_turn",
+        "stop_sequence": None,
+        "usage": counts,
+    }
+
+    if not body.get("stream"):
+        inflight += 1
+        try:
+            await think(output)
+        finally:
+            inflight -= 1
+        return {**message, "content": [block]}
+
+    stats["streamed"] += 1
+
+    async def events():
+        global inflight
+        inflight += 1
+        try:
+            ttft = rng.lognormvariate(0, LATENCY_SIGMA) * LATENCY_MS
+            await asyncio.sleep(ttft / 1000)
+            start = dict(message, content=[], stop_reason=None, usage=dict(counts, output_tokens=1))
+            yield sse("message_start", {"type": "message_start", "message": start})
+
+            empty = dict(block, input={}) if use_tool else dict(block, text="")
+            yield sse("content_block_start", {"type": "content_block_start", "index": 0, "content_block": empty})
+            for i in range(0, len(output), 16):
+                await asyncio.sleep(tokens(output[i:i + 16]) * TOKEN_MS / 1000)
+                delta = (
+                    {"type": "input_json_delta", "partial_json": output[i:i + 16]}
+                    if use_tool else
+                    {"type": "text_delta", "text": output[i:i + 16]}
+                )
+                yield sse("content_block_delta", {"type": "content_block_delta", "index": 0, "delta": delta})
+            yield sse("content_block_stop", {"type": "content_block_stop", "index": 0})
+            yield sse("message_delta", {
+                "type": "message_delta",
+                "delta": {"stop_reason": message["stop_reason"], "stop_sequence": None},
+                "usage": {"output_tokens": counts["output_tokens"]},
+            })
+            yield sse("message_stop", {"type": "message_stop"})
+        finally:
+            inflight -= 1
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+# ---------------------------------------
+# PubMed stand-in
+# ---------------------------------------
+
+@app.get("/esearch.fcgi")
+async def esearch(term: str = "", retmax: int = 10):
+    stats["pubmed"] += 1
+    seed = int(hashlib.sha256(term.encode()).hexdigest()[:6], 16)
+    return {"esearchresult": {"idlist": [str(seed + i) for i in range(retmax)]}}
+
+
+@app.get("/esummary.fcgi")
+async def esummary(id: str = ""):
+    stats["pubmed"] += 1
+    ids = [i for i in id.split(",") if i]
+    return {"result": {"uids": ids, **{i: {"uid": i, "title": f"Mock paper {i}"} for i in ids}}}
+
+
+# ---------------------------------------
+# Bench control
+# ---------------------------------------
+
+@app.get("/stats")
+async def get_stats():
+    return stats
+
+
+@app.post("/stats/reset")
+async def post_reset():
+    reset_stats()
+    return stats
@@ -0,0 +1,104 @@
+import json
+import random
+from datetime import date
+from pathlib import Path
+
+# ---------------------------------------
+# Synthetic clinical notes
+# ---------------------------------------
+#
+# example1.txt is the seed: its layout is one template, and a few looser
+# variants are added so some notes still need the LLM for extraction.
+
+BACKEND_PATH = Path(__file__).resolve().parent.parent
+EXAMPLE_PATH = BACKEND_PATH / "example1.txt"
+DIAGNOSES_PATH = BACKEND_PATH / "static" / "diagnoses.json"
+
+FIRST_NAMES = ["Sarah", "James", "Maria", "David", "Aisha", "Wei", "Elena", "Tom", "Priya", "Lucas"]
+LAST_NAMES = ["Lopez", "Smith", "Nguyen", "Okafor", "Kim", "Müller", "Rossi", "Patel", "Brown", "Cohen"]
+ALLERGIES = ["penicillin", "sulfa", "shellfish", "latex", "cephalosporins", "nsaids", "codeine"]
+CONDITIONS = ["asthma", "hypertension", "type 2 diabetes", "ckd stage 3", "gerd", "migraine", "copd"]
+
+VARIANTS = [
+    # Loose narrative — no "Today's diagnosis:" label
+    "{age} yo {sex_short} seen today, {pronoun_lower} reports symptoms for a week. "
+    "{allergy_sentence} Hx: {condition_text}. Impression: likely {diagnosis}.",
+    # Shorthand intake
+    "Pt {name}. {age}{sex_short}. Allergies: {allergy_text}. PMH: {condition_text}. "
+    "Dx {diagnosis}. {pregnancy}",
+]
+
+
+def load_diagnoses() -> list:
+    with open(DIAGNOSES_PATH, "r") as f:
+        entries = json.load(f)
+    return [name for entry in entries for name in [entry["name"], *entry.get("synonyms", [])[:1]]]
+
+
+def example_template() -> str:
+    """
+    example1.txt with its patient-specific values replaced by placeholders.
+    """
+    text = EXAMPLE_PATH.read_text()
+    for original, field in [
+        ("Sarah Lopez", "{name}"),
+        ("1992-11-04", "{dob}"),
+        ("age 32", "age {age}"),
+        ("female", "{sex}"),
+        ("She is not pregnant.", "{pregnancy}"),
+        ("Allergic to penicillin and shellfish.", "{allergy_sentence}"),
+        ("Past conditions include asthma.", "{condition_sentence}"),
+        ("acute bacterial sinusitis", "{diagnosis}"),
+    ]:
+        text = text.replace(original, field)
+    return text
+
+
+def join(items: list) -> str:
+    if not items:
+        return "none"
+    if len(items) == 1:
+        return items[0]
+    return ", ".join(items[:-1]) + " and " + items[-1]
+
+
+def generate(count: int, seed: int = 0, variant_rate: float = 0.3) -> list:
+    """
+    `count` reproducible notes; roughly variant_rate of them use the looser
+    templates.
+    """
+    rng = random.Random(seed)
+    diagnoses = load_diagnoses()
+    base = example_template()
+    today = date.today()
+
+    notes = []
+    for _ in range(count):
+        age = rng.randint(1, 90)
+        sex = rng.choice(["female", "male"])
+        pregnant = sex == "female" and 18 <= age <= 45 and rng.random() < 0.15
+        pronoun = "She" if sex == "female" else "He"
+        allergies = rng.sample(ALLERGIES, rng.randint(0, 2))
+        conditions = rng.sample(CONDITIONS, rng.randint(0, 2))
+        values = {
+            "name": f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+            "dob": date(today.year - age, rng.randint(1, 12), rng.randint(1, 28)).isoformat(),
+            "age": age,
+            "sex": sex,
+            "sex_short": sex[0].upper(),
+            "pronoun_lower": pronoun.lower(),
+            "pregnancy": "She is pregnant." if pregnant else ("She is not pregnant." if sex == "female" else ""),
+            "allergy_text": join(allergies),
+            "allergy_sentence": f"Allergic to {join(allergies)}." if allergies else "No known drug allergies.",
+            "condition_text": join(conditions),
+            "condition_sentence": f"Past conditions include {join(conditions)}." if conditions else "No significant past history.",
+            "diagnosis": rng.choice(diagnoses),
+        }
+        template = rng.choice(VARIANTS) if rng.random() < variant_rate else base
+        notes.append(template.format(**values))
+    return notes
+
+
+if __name__ == "__main__":
+    for note in generate(5):
+        print(note, end="\n---\n")
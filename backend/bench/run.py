@@ -0,0 +1,350 @@
+"""
+Offline load test for server.py against bench/mock_anthropic.py.
+
+    cd backend
+    python -m bench.run --concurrency 1,8,32 --requests 100
+    python -m bench.run --malformed-rate 0.1 --rate-limit-rate 0.05
+    python -m bench.run --compare bench/results/<earlier>.json
+
+Record once, then re-run from the LLM response store with no API calls:
+
+    python -m bench.run --env LLM_STORE_MODE=record --env LLM_STORE_PATH=/tmp/bench.db
+    python -m bench.run --env LLM_STORE_MODE=replay --env LLM_STORE_PATH=/tmp/bench.db
+
+Each scenario (endpoint x concurrency) gets a freshly started backend, so
+in-process caches start cold. Results are written as JSON under
+bench/results/ (or --out) and can be diffed with --compare.
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import argparse
+import subprocess
+from pathlib import Path
+import httpx
+from bench.notes import generate
+
+# ---------------------------------------
+# Initialization
+# ---------------------------------------
+
+BACKEND_PATH = Path(__file__).resolve().parent.parent
+RESULTS_PATH = Path(__file__).resolve().parent / "results"
+
+ENDPOINTS = ("analyze", "stream", "batch")
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def percentile(values: list, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered) + 0.5) - 1))
+    return round(ordered[index], 1)
+
+
+def summarize(latencies: list) -> dict:
+    return {
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+        "mean": round(sum(latencies) / len(latencies), 1) if latencies else 0.0,
+        "max": round(max(latencies), 1) if latencies else 0.0,
+    }
+
+
+def git_commit() -> str:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_PATH, capture_output=True, text=True)
+        return out.stdout.strip()
+    except OSError:
+        return ""
+
+
+# ---------------------------------------
+# Processes
+# ---------------------------------------
+
+def start(app: str, port: int, env: dict) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", app, "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_PATH,
+        env={**os.environ, **env},
+    )
+
+
+def stop(proc: subprocess.Popen):
+    proc.terminate()
+    try:
+        proc.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+
+
+async def wait_ready(client: httpx.AsyncClient, url: str, timeout: float = 20):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get(url)).status_code < 500:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.1)
+    raise RuntimeError(f"{url} did not come up")
+
+
+def mock_env(args) -> dict:
+    return {
+        "MOCK_LATENCY_MS": str(args.latency_ms),
+        "MOCK_LATENCY_SIGMA": str(args.latency_sigma),
+        "MOCK_TOKEN_MS": str(args.token_ms),
+        "MOCK_MALFORMED_RATE": str(args.malformed_rate),
+        "MOCK_RATE_LIMIT_RATE": str(args.rate_limit_rate),
+        "MOCK_MAX_INFLIGHT": str(args.max_inflight),
+        "MOCK_SEED": str(args.seed),
+    }
+
+
+def backend_env(args, mock_url: str) -> dict:
+    return {
+        "ANTHROPIC_BASE_URL": mock_url,
+        "ARYA_API_KEY": "bench",
+        "PUBMED_BASE_URL": mock_url,
+        "PUBMED_RATE_LIMIT": "0",
+        # Disk caches would carry results between scenarios
+        "CACHE_DIR": "",
+        # Don't reach out to Supabase or pre-warm during startup
+        "SUPABASE_URL": "",
+        "VITE_SUPABASE_URL": "",
+        "WARMUP_ENABLED": "0",
+        **dict(item.split("=", 1) for item in args.env),
+    }
+
+
+# ---------------------------------------
+# Drivers
+# ---------------------------------------
+
+async def drive_analyze(client, url, notes, concurrency, stages):
+    latencies, errors = [], 0
+    queue = list(enumerate(notes))
+
+    async def worker():
+        nonlocal errors
+        while queue:
+            _, note = queue.pop()
+            started = time.perf_counter()
+            try:
+                resp = await client.post(f"{url}/analyze", json={"text": note, "stages": stages})
+                resp.raise_for_status()
+                latencies.append((time.perf_counter() - started) * 1000)
+            except httpx.HTTPError:
+                errors += 1
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return {"latency_ms": summarize(latencies), "errors": errors}
+
+
+async def drive_stream(client, url, notes, concurrency, stages):
+    latencies, first_event, errors = [], [], 0
+    queue = list(enumerate(notes))
+
+    async def worker():
+        nonlocal errors
+        while queue:
+            _, note = queue.pop()
+            started = time.perf_counter()
+            first = None
+            failed = False
+            try:
+                async with client.stream("POST", f"{url}/analyze/stream", json={"text": note, "stages": stages}) as resp:
+                    resp.raise_for_status()
+                    async for line in resp.aiter_lines():
+                        if line.startswith("event:"):
+                            if first is None:
+                                first = (time.perf_counter() - started) * 1000
+                            failed = failed or line.strip() == "event: error"
+            except httpx.HTTPError:
+                failed = True
+            if failed:
+                errors += 1
+                continue
+            latencies.append((time.perf_counter() - started) * 1000)
+            if first is not None:
+                first_event.append(first)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return {"latency_ms": summarize(latencies), "first_event_ms": summarize(first_event), "errors": errors}
+
+
+async def drive_batch(client, url, notes, concurrency, stages):
+    """
+    One /analyze/batch request; latency is per-line arrival time.
+    """
+    latencies, errors = [], 0
+    started = time.perf_counter()
+    body = {"notes": notes, "stages": stages}
+    try:
+        async with client.stream("POST", f"{url}/analyze/batch", params={"concurrency": concurrency}, json=body) as resp:
+            resp.raise_for_status()
+            async for line in resp.aiter_lines():
+                if not line.strip():
+                    continue
+                if "error" in json.loads(line):
+                    errors += 1
+                else:
+                    latencies.append((time.perf_counter() - started) * 1000)
+    except httpx.HTTPError:
+        errors = len(notes) - len(latencies)
+    return {"latency_ms": summarize(latencies), "errors": errors}
+
+
+DRIVERS = {"analyze": drive_analyze, "stream": drive_stream, "batch": drive_batch}
+
+
+# ---------------------------------------
+# Scenarios
+# ---------------------------------------
+
+async def run_scenario(args, endpoint: str, concurrency: int, notes: list, mock_url: str) -> dict:
+    port = free_port()
+    url = f"http://127.0.0.1:{port}"
+    proc = start("server:app", port, backend_env(args, mock_url))
+
+    try:
+        async with httpx.AsyncClient(timeout=args.timeout, limits=httpx.Limits(max_connections=concurrency + 4)) as client:
+            await wait_ready(client, f"{url}/usage")
+            await client.post(f"{mock_url}/stats/reset")
+
+            started = time.perf_counter()
+            result = await DRIVERS[endpoint](client, url, notes, concurrency, args.stages)
+            elapsed = time.perf_counter() - started
+
+            stats = (await client.get(f"{mock_url}/stats")).json()
+            usage = (await client.get(f"{url}/usage")).json()
+    finally:
+        stop(proc)
+
+    completed = len(notes) - result["errors"]
+    return {
+        "endpoint": endpoint,
+        "concurrency": concurrency,
+        "requests": len(notes),
+        **result,
+        "elapsed_s": round(elapsed, 2),
+        "rps": round(completed / elapsed, 2) if elapsed else 0.0,
+        "llm_calls_per_request": round(stats["messages"] / len(notes), 2),
+        "llm": stats,
+        "tokens": usage,
+    }
+
+
+async def run(args) -> dict:
+    notes = generate(args.requests, seed=args.seed, variant_rate=args.variant_rate)
+    mock_port = free_port()
+    mock_url = f"http://127.0.0.1:{mock_port}"
+    mock = start("bench.mock_anthropic:app", mock_port, mock_env(args))
+
+    scenarios = []
+    try:
+        async with httpx.AsyncClient() as client:
+            await wait_ready(client, f"{mock_url}/stats")
+        for endpoint in args.endpoints:
+            for concurrency in args.concurrency:
+                scenario = await run_scenario(args, endpoint, concurrency, notes, mock_url)
+                scenarios.append(scenario)
+                print(
+                    f"{endpoint:8} c={concurrency:<4} p50={scenario['latency_ms']['p50']:>8}ms "
+                    f"p95={scenario['latency_ms']['p95']:>8}ms p99={scenario['latency_ms']['p99']:>8}ms "
+                    f"rps={scenario['rps']:>7} llm/req={scenario['llm_calls_per_request']:>5} "
+                    f"errors={scenario['errors']}"
+                )
+    finally:
+        stop(mock)
+
+    return {
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": git_commit(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("out", "compare")},
+        "scenarios": scenarios,
+    }
+
+
+def compare(current: dict, baseline: dict):
+    """
+    Print p50/p95/rps/llm-calls deltas for scenarios present in both runs.
+    """
+    previous = {(s["endpoint"], s["concurrency"]): s for s in baseline.get("scenarios", [])}
+    print(f"\nvs {baseline.get('commit') or '?'} ({baseline.get('started_at', '?')})")
+    for scenario in current["scenarios"]:
+        old = previous.get((scenario["endpoint"], scenario["concurrency"]))
+        if old is None:
+            continue
+
+        def delta(new, before):
+            return f"{(new - before) / before * 100:+.1f}%" if before else "n/a"
+
+        print(
+            f"{scenario['endpoint']:8} c={scenario['concurrency']:<4} "
+            f"p50 {delta(scenario['latency_ms']['p50'], old['latency_ms']['p50']):>8} "
+            f"p95 {delta(scenario['latency_ms']['p95'], old['latency_ms']['p95']):>8} "
+            f"rps {delta(scenario['rps'], old['rps']):>8} "
+            f"llm/req {delta(scenario['llm_calls_per_request'], old['llm_calls_per_request']):>8}"
+        )
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    csv = lambda value: [item.strip() for item in value.split(",") if item.strip()]
+
+    parser.add_argument("--endpoints", type=csv, default=list(ENDPOINTS), help="comma list of analyze,stream,batch")
+    parser.add_argument("--concurrency", type=lambda v: [int(c) for c in csv(v)], default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=50, help="notes per scenario")
+    parser.add_argument("--stages", type=csv, default=None, help="pipeline stages, e.g. agent0,agent1,agent2,agent3")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--variant-rate", type=float, default=0.3, help="share of loosely formatted notes")
+    parser.add_argument("--timeout", type=float, default=120)
+
+    mock = parser.add_argument_group("mock API")
+    mock.add_argument("--latency-ms", type=float, default=400, help="median time to first token")
+    mock.add_argument("--latency-sigma", type=float, default=0.5, help="lognormal sigma")
+    mock.add_argument("--token-ms", type=float, default=2, help="per output token")
+    mock.add_argument("--malformed-rate", type=float, default=0.0)
+    mock.add_argument("--rate-limit-rate", type=float, default=0.0)
+    mock.add_argument("--max-inflight", type=int, default=0, help="429 above this many in-flight calls (0 = off)")
+
+    parser.add_argument("--env", action="append", default=[], help="extra backend env, KEY=VALUE (repeatable)")
+    parser.add_argument("--out", type=Path, default=None)
+    parser.add_argument("--compare", type=Path, default=None, help="earlier results JSON")
+
+    args = parser.parse_args(argv)
+    unknown = set(args.endpoints) - set(ENDPOINTS)
+    if unknown:
+        parser.error(f"unknown endpoints: {sorted(unknown)}")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    results = asyncio.run(run(args))
+
+    out = args.out or RESULTS_PATH / f"bench-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(results, indent=2))
+    print(f"\nsaved {out}")
+
+    if args.compare:
+        compare(results, json.loads(args.compare.read_text()))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,47 @@
-from fastapi import FastAPI, Request
+import os
+import json
+import time
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+import httpx
+from fastapi import FastAPI, Request, HTTPException
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from agents.agent0 import agent0
-from agents.agent1 import agent1
-from agents.agent2 import agent2
 from agents.agent3 import agent3
-from fastapi.middleware.cors import CORSMiddleware
+from agents.pipeline import iter_batch, iter_pipeline, run_pipeline, resolve_stages
+from agents.diagnoses import get_index
+from agents import warmup
+from agents.llm import usage_totals
+from agents import metrics
+from agents import resilience
+
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Extend the static diagnosis index with the Supabase table, if configured
+    try:
+        added = await get_index().seed_from_supabase()
+        if added:
+            logger.info("seeded %d diagnoses from supabase", added)
+    except (httpx.HTTPError, ValueError) as err:
+        logger.warning("diagnosis seeding skipped: %s", err)
+
+    # Pre-fill agent caches for common diagnoses, yielding to live traffic
+    warming = asyncio.create_task(warmup.warmup_loop(busy=lambda: live_requests > warmup.WARMUP_MAX_LIVE))
+    yield
+    warming.cancel()
+
 
+app = FastAPI(lifespan=lifespan)
 
-app = FastAPI()
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "64"))
+
+# Requests currently being handled (the warm-up backs off above a threshold)
+live_requests = 0
 
 
 app.add_middleware(
@@ -16,9 +50,27 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
 )
 
 
+@app.middleware("http")
+async def add_server_timing(request: Request, call_next):
+    global live_requests
+    # Agents add their stage durations to this dict as they finish
+    timings = {}
+    token = metrics.request_timings.set(timings)
+    live_requests += 1
+    try:
+        response = await call_next(request)
+    finally:
+        live_requests -= 1
+        metrics.request_timings.reset(token)
+    if timings:
+        response.headers["Server-Timing"] = metrics.server_timing(timings)
+    return response
+
+
 
 @app.post("/analyze")
 async def analyze_patient(request: Request):
@@ -26,15 +78,171 @@ async def analyze_patient(request: Request):
 
     # Text from frontend
     patient_text = data.get("text", "")
+    stages = requested_stages(data)
+
+    # Stage DAG (agents/pipeline.py): each stage starts once its inputs are
+    # done, and agent0's dependents start while it is still streaming
+    return await run_pipeline(patient_text, stages, requested_deadline(data))
+
+
+def requested_stages(data: dict):
+    """
+    Optional "stages" list in the request body, e.g. ["agent2", "agent3"].
+    """
+    stages = data.get("stages")
+    try:
+        resolve_stages(stages)
+    except (TypeError, ValueError) as err:
+        raise HTTPException(status_code=400, detail=str(err))
+    return stages
+
+
+def requested_deadline(data: dict):
+    """
+    Optional "deadline_ms" in the request body. It can shorten the server's
+    REQUEST_DEADLINE_SECONDS budget, never extend it.
+    """
+    deadline_ms = data.get("deadline_ms")
+    if deadline_ms is None:
+        return None
+    try:
+        seconds = float(deadline_ms) / 1000
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="deadline_ms must be a number")
+    if seconds <= 0:
+        raise HTTPException(status_code=400, detail="deadline_ms must be positive")
+    if resilience.REQUEST_DEADLINE > 0:
+        seconds = min(seconds, resilience.REQUEST_DEADLINE)
+    return seconds
+
+
+def sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.post("/analyze/stream")
+async def analyze_patient_stream(request: Request):
+    """
+    Same pipeline as /analyze, sent as Server-Sent Events: one event per
+    stage as it completes (event name = stage, data = its output), then a
+    final "done" event with each stage's start and finish times (ms since
+    the request began) and any degraded stages.
+    """
+    data = await request.json()
+
+    patient_text = data.get("text", "")
+    stages = requested_stages(data)
+    deadline = requested_deadline(data)
+
+    async def events():
+        started = time.perf_counter()
+        timings = {}
+        starts = {}
+        degraded = {}
+
+        try:
+            async for event in iter_pipeline(patient_text, stages, deadline, degraded):
+                timings[event["stage"]] = event["elapsed_ms"]
+                starts[event["stage"]] = event["started_ms"]
+                yield sse(event["stage"], event["output"])
+        except Exception as err:
+            yield sse("error", {"error": str(err)})
+
+        total_ms = round((time.perf_counter() - started) * 1000, 1)
+        yield sse("done", {"total_ms": total_ms, "stages_ms": timings, "started_ms": starts, "degraded": degraded})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def read_line(line: str):
+    # A bad line becomes that note's error instead of failing the batch
+    try:
+        return json.loads(line)
+    except ValueError as err:
+        return ValueError(f"Invalid NDJSON line: {err}")
+
+
+async def read_batch(request: Request):
+    """
+    Accepts either a JSON body — a list of notes, or
+    {"notes": [...], "stages": [...]} — or NDJSON (one note per line).
+    A note is a string or an object with a "text" field.
+    """
+    body = await request.body()
+    content_type = request.headers.get("content-type", "")
+
+    try:
+        if "ndjson" in content_type or "jsonlines" in content_type:
+            notes = [read_line(line) for line in body.decode().splitlines() if line.strip()]
+            return notes, None
+
+        data = json.loads(body or b"[]")
+    except (UnicodeDecodeError, ValueError) as err:
+        raise HTTPException(status_code=400, detail=f"Invalid batch body: {err}")
+
+    if isinstance(data, dict):
+        notes = data.get("notes", [])
+        if not isinstance(notes, list):
+            raise HTTPException(status_code=400, detail="\"notes\" must be a list")
+        return notes, requested_stages(data)
+    if isinstance(data, list):
+        return data, None
+    raise HTTPException(status_code=400, detail="Batch body must be a list of notes")
+
+
+@app.post("/analyze/batch")
+async def analyze_batch(request: Request, concurrency: int = BATCH_CONCURRENCY, stages: str = None):
+    """
+    Runs /analyze over many notes and streams NDJSON back in completion
+    order, one line per note: {"index": i, "result": {...}} or
+    {"index": i, "error": "..."}.
+    """
+    notes, body_stages = await read_batch(request)
+    if stages is not None:
+        body_stages = requested_stages({"stages": [s.strip() for s in stages.split(",") if s.strip()]})
+
+    concurrency = max(1, min(concurrency, BATCH_MAX_CONCURRENCY))
+
+    async def lines():
+        async for item in iter_batch(notes, concurrency, body_stages):
+            yield json.dumps(item) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+
+@app.get("/health")
+async def health():
+    """
+    Liveness plus warm-up progress. "ready" turns true once the first
+    warm-up pass has finished (or warm-up is disabled).
+    """
+    return {"status": "ok", "ready": warmup.is_ready(), "warmup": warmup.state}
+
+
+@app.get("/health/ready")
+async def health_ready():
+    if not warmup.is_ready():
+        raise HTTPException(status_code=503, detail=warmup.state)
+    return {"ready": True}
+
 
-    # Agent 0 -> Agent 1 -> Agent 2
-    agent0_output = agent0(patient_text)
-    agent1_output = agent1(agent0_output)
-    agent2_output = agent2(agent1_output)
+@app.get("/usage")
+async def llm_usage():
+    """
+    Process-wide LLM token totals, including prompt-cache reads/writes.
+    """
+    return usage_totals
 
-    return {
-        "agent0_output": agent0_output,
-        "agent1_output": agent1_output,
-        "agent2_output": agent2_output
-    }
 
+@app.get("/metrics")
+async def prometheus_metrics():
+    """
+    Latency histograms, token/retry/repair counters and cache hit ratios in
+    Prometheus text format.
+    """
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,14 @@
+import os
+import sys
+from pathlib import Path
+
+# Tests import the backend the way server.py does ("from agents.x import ...")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# No disk caches, stored responses or background work under test
+os.environ.setdefault("ARYA_API_KEY", "test")
+os.environ.setdefault("CACHE_DIR", "")
+os.environ.setdefault("LLM_STORE_MODE", "off")
+os.environ.setdefault("WARMUP_ENABLED", "0")
+os.environ.setdefault("SUPABASE_URL", "")
+os.environ.setdefault("SUPABASE_KEY", "")
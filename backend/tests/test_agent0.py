@@ -0,0 +1,37 @@
+import asyncio
+from agents import agent0, agent3
+from agents.agent0 import AGENT0_PROMPT, PATIENT_SCHEMA
+
+
+def test_diagnosis_streams_first():
+    assert next(iter(PATIENT_SCHEMA["properties"])) == "diagnosis"
+    assert AGENT0_PROMPT.index('"diagnosis"') < AGENT0_PROMPT.index('"name"')
+
+
+def test_tool_schemas_do_not_change_per_call(monkeypatch):
+    # Tools lead the cached prefix, so a per-call schema would break it
+    schemas = []
+
+    def stream(prompt, **params):
+        schemas.append(params["schema"])
+
+        async def chunks():
+            yield '{"diagnosis": "flu"}'
+        return chunks()
+
+    async def structured(prompt, **params):
+        schemas.append(params["schema"])
+        return None
+
+    monkeypatch.setattr(agent0, "stream_llm", stream)
+    monkeypatch.setattr(agent3, "call_structured", structured)
+
+    async def main():
+        await agent0.llm_extract("note", ["diagnosis"], {})
+        await agent0.llm_extract("note", ["age", "allergies"], {})
+        await agent3.call_llm_json("", {"suggested_meds": ["a"]}, max_attempts=1)
+        await agent3.call_llm_json("", {"suggested_meds": ["b", "c"]}, max_attempts=1)
+
+    asyncio.run(main())
+    assert schemas[0] is schemas[1] is PATIENT_SCHEMA
+    assert schemas[2] is schemas[3] is agent3.FILTER_SCHEMA
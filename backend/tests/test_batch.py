@@ -0,0 +1,24 @@
+import json
+from fastapi.testclient import TestClient
+from server import app
+
+client = TestClient(app)
+
+
+def lines(resp) -> list:
+    return sorted((json.loads(line) for line in resp.text.splitlines() if line.strip()), key=lambda item: item["index"])
+
+
+def test_malformed_ndjson_line_is_a_per_note_error():
+    body = '{"text": 1}\n{not json\n\n42\n'
+    resp = client.post("/analyze/batch", content=body, headers={"content-type": "application/x-ndjson"})
+    assert resp.status_code == 200
+    items = lines(resp)
+    assert [item["index"] for item in items] == [0, 1, 2]
+    assert all("error" in item for item in items)
+    assert items[1]["error"].startswith("Invalid NDJSON line")
+
+
+def test_notes_must_be_a_list():
+    resp = client.post("/analyze/batch", json={"notes": "ab"})
+    assert resp.status_code == 400
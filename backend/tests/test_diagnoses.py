@@ -0,0 +1,35 @@
+import pytest
+from agents.diagnoses import UNKNOWN_PREFIX, get_index
+
+
+@pytest.mark.parametrize("diagnosis, expected", [
+    ("Strep throat", "J02.0"),
+    ("sinusitis, acute bacterial", "J01.90"),
+    ("UTI", "N39.0"),
+    ("hypertenshion", "I10"),
+    ("type 2 diabetis", "E11.9"),
+    ("urinary tract infektion", "N39.0"),
+])
+def test_same_diagnosis_shares_an_id(diagnosis, expected):
+    assert get_index().canonical_id(diagnosis) == expected
+
+
+@pytest.mark.parametrize("diagnosis", [
+    "type 1 diabetes",
+    "complicated urinary tract infection",
+    "acute viral sinusitis",
+    "acute sinusitis",
+    "sinus infection",
+    "pulmonary hypertension",
+    "acute otitis externa",
+    "viral pneumonia",
+    "hospital-acquired pneumonia",
+    "chronic bronchitis",
+    "ear infection",
+    "skin and soft tissue infection",
+    "ssti",
+    "yeast infection",
+    "anxiety",
+])
+def test_different_diagnosis_is_not_merged(diagnosis):
+    assert get_index().canonical_id(diagnosis).startswith(UNKNOWN_PREFIX)
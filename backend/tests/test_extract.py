@@ -0,0 +1,138 @@
+from pathlib import Path
+import pytest
+from agents.extract import (
+    EXPLICIT,
+    extract_age,
+    extract_allergies,
+    extract_conditions,
+    extract_fields,
+    extract_pregnant,
+    extract_sex,
+)
+
+THRESHOLD = 0.8
+EXAMPLE_PATH = Path(__file__).resolve().parent.parent / "example1.txt"
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("Allergic to penicillin and shellfish.", ["penicillin", "shellfish"]),
+    ("Penicillin allergy. Diagnosis: strep throat.", ["penicillin"]),
+    ("Sulfa allergy; penicillin allergy.", ["sulfa", "penicillin"]),
+    ("Allergic to penicillin (anaphylaxis)", ["penicillin"]),
+    ("Allergies: pcn - hives, sulfa (rash).", ["pcn", "sulfa"]),
+    ("Allergies: penicillin. Diagnosis: otitis media.", ["penicillin"]),
+    ("Patient has a severe sulfa drug allergy.", ["sulfa"]),
+    ("Peanut and shellfish allergies.", ["peanut", "shellfish"]),
+    ("Not allergic to anything.", []),
+    ("No known drug allergies.", []),
+    ("NKDA.", []),
+])
+def test_allergies(text, expected):
+    items, confidence = extract_allergies(text)
+    assert items == expected
+    assert confidence >= THRESHOLD
+
+
+@pytest.mark.parametrize("text", [
+    "Allergies: see chart, multiple antibiotics listed in ER record.",
+    "Allergic to some kind of antibiotic she took as a child.",
+])
+def test_unclear_allergies_go_to_the_model(text):
+    items, confidence = extract_allergies(text)
+    assert items == []
+    assert confidence < THRESHOLD
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("Past conditions include asthma.", ["asthma"]),
+    ("PMH: HTN, type 2 diabetes. Dx: cellulitis.", ["htn", "type 2 diabetes"]),
+    ("PMH: none.", []),
+    ("No significant past history.", []),
+])
+def test_conditions(text, expected):
+    items, confidence = extract_conditions(text)
+    assert items == expected
+    assert confidence >= THRESHOLD
+
+
+@pytest.mark.parametrize("text", [
+    "No history of asthma.",
+    "Family history of heart disease.",
+    "History of asthma, no diabetes.",
+])
+def test_negated_or_family_conditions_go_to_the_model(text):
+    items, confidence = extract_conditions(text)
+    assert items == []
+    assert confidence < THRESHOLD
+
+
+@pytest.mark.parametrize("text, age, sex", [
+    ("Jane Doe, 45F, presents with cough.", 45, "female"),
+    ("66 yo M with chest pain.", 66, "male"),
+    ("32-year-old F.", 32, "female"),
+    ("Patient: 72 M.", 72, "male"),
+    ("HR 88, BP 120/80. 54M here for follow-up.", 54, "male"),
+])
+def test_age_and_sex_shorthand(text, age, sex):
+    assert extract_age(text) == (age, EXPLICIT)
+    assert extract_sex(text) == (sex, EXPLICIT)
+
+
+@pytest.mark.parametrize("text", [
+    "Temp 101.2 F",
+    "T 101 F",
+    "Temp: 99 F, HR 100.",
+    "Smoker for 20 years.",
+])
+def test_vitals_and_durations_are_not_ages(text):
+    assert extract_age(text)[0] is None
+    assert extract_sex(text)[0] == ""
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("Hx: asthma, CKD.", ["asthma", "ckd"]),
+    ("Known CKD stage 3 and heart failure.", ["ckd stage 3", "heart failure"]),
+    ("H/o migraine.", ["migraine"]),
+])
+def test_condition_shorthand(text, expected):
+    items, confidence = extract_conditions(text)
+    assert items == expected
+    assert confidence >= THRESHOLD
+
+
+def test_silence_about_conditions_and_allergies_goes_to_the_model():
+    text = "45F with CKD and heart failure, sore throat for 2 days."
+    assert extract_conditions(text)[1] < THRESHOLD
+    assert extract_allergies(text)[1] < THRESHOLD
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("She is not pregnant.", False),
+    ("Pregnancy test negative.", False),
+    ("Negative urine pregnancy test.", False),
+    ("She is 12 weeks pregnant.", True),
+    ("Pregnant female with UTI.", True),
+    ("Currently in her second trimester.", True),
+])
+def test_pregnant(text, expected):
+    value, confidence = extract_pregnant(text, "female")
+    assert value is expected
+    assert confidence >= THRESHOLD
+
+
+@pytest.mark.parametrize("text", [
+    "Her sister is pregnant.",
+    "History of pregnancy loss.",
+])
+def test_unclear_pregnancy_goes_to_the_model(text):
+    value, confidence = extract_pregnant(text, "female")
+    assert value is False
+    assert confidence < THRESHOLD
+
+
+def test_example_note():
+    values, confidence = extract_fields(EXAMPLE_PATH.read_text())
+    assert values["allergies"] == ["penicillin", "shellfish"]
+    assert values["conditions"] == ["asthma"]
+    assert values["pregnant"] is False
+    assert confidence["pregnant"] == EXPLICIT
@@ -0,0 +1,37 @@
+import time
+import pytest
+from anthropic.types import Message
+from agents.llmstore import ResponseStore, ReplayMiss
+
+PARAMS = {"model": "m", "max_tokens": 10, "temperature": 0, "messages": [{"role": "user", "content": "hi"}]}
+MESSAGE = Message.model_validate({
+    "id": "msg_1", "type": "message", "role": "assistant", "model": "m",
+    "content": [{"type": "text", "text": "hello"}],
+    "stop_reason": "end_turn", "stop_sequence": None,
+    "usage": {"input_tokens": 1, "output_tokens": 1},
+})
+
+
+def test_off_mode_passes_through():
+    store = ResponseStore(path=":memory:", mode="off")
+    store.save(PARAMS, MESSAGE)
+    assert store.lookup(PARAMS) is None
+
+
+def test_live_mode_expires_after_ttl():
+    store = ResponseStore(path=":memory:", mode="live", ttl=60)
+    store.save(PARAMS, MESSAGE)
+    assert store.lookup(PARAMS).content[0].text == "hello"
+
+    store._connect().execute("UPDATE responses SET created_at = ?", (time.time() - 120,))
+    assert store.lookup(PARAMS) is None
+
+
+def test_replay_ignores_ttl():
+    store = ResponseStore(path=":memory:", mode="record", ttl=60)
+    store.save(PARAMS, MESSAGE)
+    store._connect().execute("UPDATE responses SET created_at = ?", (time.time() - 120,))
+    store.mode = "replay"
+    assert store.lookup(PARAMS).content[0].text == "hello"
+    with pytest.raises(ReplayMiss):
+        store.lookup(dict(PARAMS, max_tokens=11))
@@ -0,0 +1,46 @@
+import asyncio
+import pytest
+from agents import agent3
+from agents.medfilter import allergy_term, get_filter
+
+
+@pytest.mark.parametrize("allergy, expected", [
+    ("penicillin", "penicillin"),
+    ("Penicillin allergy", "penicillin"),
+    ("penicillin (anaphylaxis)", "penicillin"),
+    ("PCN - hives", "penicillin"),
+    ("allergic to sulfa: rash", "sulfa"),
+    ("ASA", "aspirin"),
+    ("sulfa drugs causing rash", "sulfa"),
+    ("codeine itch", "codeine"),
+])
+def test_allergy_term(allergy, expected):
+    assert allergy_term(allergy) == expected
+
+
+@pytest.mark.parametrize("allergy", ["penicillin allergy", "PCN (hives)", "Penicillin - anaphylaxis"])
+def test_allergy_wording_still_rejects(allergy):
+    result = get_filter().classify({"allergies": [allergy], "suggested_meds": ["amoxicillin", "azithromycin"]})
+    assert [item["med"] for item in result["unacceptable_meds"]] == ["amoxicillin"]
+    assert result["acceptable_meds"] == ["azithromycin"]
+
+
+def test_asa_rejects_nsaids():
+    result = get_filter().classify({"allergies": ["ASA"], "suggested_meds": ["ibuprofen"]})
+    assert [item["med"] for item in result["unacceptable_meds"]] == ["ibuprofen"]
+
+
+def test_unknown_meds_are_unverified_without_fallback():
+    patient = {"allergies": [], "suggested_meds": ["amoxicillin", "zorblaxin"]}
+    result = asyncio.run(agent3.agent3_async(patient, use_llm=False))
+    assert result["acceptable_meds"] == ["amoxicillin"]
+    assert result["unverified_meds"] == ["zorblaxin"]
+
+
+def test_fallback_settles_only_unverified_meds():
+    local = {"acceptable_meds": ["amoxicillin"], "unacceptable_meds": [], "unverified_meds": ["a", "b", "c"]}
+    fallback = {"acceptable_meds": ["a", "amoxicillin"], "unacceptable_meds": [{"med": "b", "reasons": ["x"]}]}
+    merged = agent3.merge_results(local, fallback)
+    assert merged["acceptable_meds"] == ["amoxicillin", "a"]
+    assert merged["unacceptable_meds"] == [{"med": "b", "reasons": ["x"]}]
+    assert merged["unverified_meds"] == ["c"]
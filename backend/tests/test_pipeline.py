@@ -0,0 +1,50 @@
+import asyncio
+from agents import pipeline
+
+PATIENT = {
+    "diagnosis": "strep throat",
+    "age": None,
+    "pregnant": False,
+    "allergies": ["penicillin"],
+    "conditions": [],
+}
+
+
+def install_fakes(monkeypatch, final: dict):
+    seen = {}
+
+    async def agent0(text: str, on_field=None):
+        # Diagnosis is known locally; allergies are still with the model
+        on_field("diagnosis", {"diagnosis": final["diagnosis"]})
+        await asyncio.sleep(0.05)
+        return dict(final)
+
+    async def agent1(patient: dict):
+        seen["agent1"] = dict(patient)
+        return {"diagnosis": patient["diagnosis"], "candidate_treatments": ["amoxicillin", "azithromycin"]}
+
+    monkeypatch.setattr(pipeline, "agent0_async", agent0)
+    monkeypatch.setattr(pipeline, "agent1_async", agent1)
+    return seen
+
+
+def test_agent3_waits_for_final_allergies(monkeypatch):
+    seen = install_fakes(monkeypatch, PATIENT)
+
+    result = asyncio.run(pipeline.run_pipeline("note", ["agent3"]))
+
+    # agent1 still started on the partial output...
+    assert "allergies" not in seen["agent1"]
+    # ...but agent3 filtered against the allergies agent0 finished with
+    rejected = [item["med"] for item in result["agent3_output"]["unacceptable_meds"]]
+    assert rejected == ["amoxicillin"]
+    assert result["agent3_output"]["acceptable_meds"] == ["azithromycin"]
+
+
+def test_speculation_miss_reruns_dependants(monkeypatch):
+    seen = install_fakes(monkeypatch, dict(PATIENT, age=70))
+
+    result = asyncio.run(pipeline.run_pipeline("note", ["agent3"]))
+
+    assert seen["agent1"]["age"] == 70
+    assert [item["med"] for item in result["agent3_output"]["unacceptable_meds"]] == ["amoxicillin"]
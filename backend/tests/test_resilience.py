@@ -0,0 +1,41 @@
+import asyncio
+import types
+import pytest
+from agents import llm, resilience
+
+USAGE = types.SimpleNamespace(input_tokens=1, output_tokens=1, cache_read_input_tokens=0, cache_creation_input_tokens=0)
+
+
+@pytest.fixture
+def slow_client(monkeypatch):
+    class Messages:
+        async def create(self, **params):
+            await asyncio.sleep(0.05)
+            return types.SimpleNamespace(content=[types.SimpleNamespace(type="text", text="ok")], usage=USAGE)
+
+    monkeypatch.setattr(llm, "get_client", lambda: types.SimpleNamespace(messages=Messages()))
+    monkeypatch.setattr(resilience, "_breakers", {})
+
+
+async def call(seconds: float):
+    resilience.start(seconds, {})
+    return await llm.call_llm("hi")
+
+
+def test_callers_own_deadline_does_not_open_the_circuit(slow_client):
+    async def main():
+        for _ in range(resilience.BREAKER_MIN_CALLS * 2):
+            with pytest.raises(resilience.DeadlineExceeded):
+                await asyncio.create_task(call(0.01))
+        return await asyncio.create_task(call(30))
+
+    assert asyncio.run(main()) == "ok"
+    assert resilience.get_breaker("anthropic").state == "closed"
+
+
+def test_released_probe_lets_the_next_call_through():
+    breaker = resilience.CircuitBreaker("test", cooldown=0)
+    breaker.state = "half_open"
+    breaker.allow()
+    breaker.release()
+    breaker.allow()
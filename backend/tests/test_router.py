@@ -0,0 +1,7 @@
+from agents import router
+
+
+def test_agent1_starts_on_fast_model():
+    current = router.route("agent1")
+    assert current["model"] == router.FAST_MODEL
+    assert router.escalate(current)["model"] == router.STRONG_MODEL
@@ -0,0 +1,19 @@
+from agents.rules import RulesSnapshot
+
+
+def test_supportive_care_is_not_a_valid_drug():
+    snapshot = RulesSnapshot(
+        {"acute bronchitis": {"recommended": ["rest", "hydration", "albuterol"], "not_recommended": ["amoxicillin"]}},
+        {"acute bronchitis": ["codeine"]},
+    )
+    assert snapshot.verdict("acute bronchitis", "rest") is None
+    assert snapshot.verdict("acute bronchitis", "hydration") is None
+    assert snapshot.verdict("acute bronchitis", "amoxicillin") == "invalid"
+    assert snapshot.verdict("acute bronchitis", "codeine") == "invalid"
+
+
+def test_recommended_drugs_stay_valid():
+    snapshot = RulesSnapshot({"influenza": {"recommended": ["oseltamivir", "Rest", "albuterol"]}}, {})
+    assert snapshot.verdict("influenza", "oseltamivir") == "valid"
+    assert snapshot.verdict("influenza", "albuterol") == "valid"
+    assert snapshot.verdict("influenza", "rest") is None
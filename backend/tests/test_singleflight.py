@@ -0,0 +1,53 @@
+import asyncio
+from agents import metrics, resilience
+from agents.batcher import MicroBatcher
+from agents.singleflight import SingleFlight
+
+
+async def observe_context():
+    await asyncio.sleep(0.05)
+    return {"remaining": resilience.remaining(), "timings": metrics.request_timings.get()}
+
+
+async def caller(run, seconds: float):
+    resilience.start(seconds, {})
+    metrics.request_timings.set({})
+    return await run()
+
+
+def test_singleflight_runs_outside_each_callers_deadline():
+    flight = SingleFlight("test")
+
+    async def main():
+        run = lambda: flight.do("key", observe_context)
+        return await asyncio.gather(
+            asyncio.create_task(caller(run, 0.01)),
+            asyncio.create_task(caller(run, 5)),
+            return_exceptions=True,
+        )
+
+    first, second = asyncio.run(main())
+    assert isinstance(first, resilience.DeadlineExceeded)
+    assert second == {"remaining": None, "timings": None}
+
+
+def test_batcher_runs_outside_each_callers_deadline():
+    async def single(item):
+        return await observe_context()
+
+    async def batch(items):
+        return [await observe_context() for _ in items]
+
+    batcher = MicroBatcher(batch, single, window=0.01)
+
+    async def main():
+        run = lambda: batcher.submit("item")
+        return await asyncio.gather(
+            asyncio.create_task(caller(run, 0.03)),
+            asyncio.create_task(caller(run, 5)),
+            return_exceptions=True,
+        )
+
+    first, second = asyncio.run(main())
+    assert isinstance(first, resilience.DeadlineExceeded)
+    assert second == {"remaining": None, "timings": None}
@@ -0,0 +1,27 @@
+import asyncio
+from agents import aiResearcher, warmup
+
+
+def test_warmup_skips_the_uncached_summary_call(monkeypatch):
+    calls = []
+
+    async def agent1(patient):
+        return {"diagnosis": patient["diagnosis"], "candidate_treatments": []}
+
+    async def agent2(candidates):
+        calls.append("agent2")
+
+    async def search(diagnosis):
+        calls.append("pubmed")
+        return []
+
+    async def summary(*args, **kwargs):
+        calls.append("summary")
+
+    monkeypatch.setattr(warmup, "agent1_async", agent1)
+    monkeypatch.setattr(warmup, "agent2_async", agent2)
+    monkeypatch.setattr(warmup, "fetch_pubmed_results", search)
+    monkeypatch.setattr(aiResearcher, "call_llm", summary)
+
+    asyncio.run(warmup.warm_diagnosis("influenza"))
+    assert sorted(calls) == ["agent2", "pubmed"]
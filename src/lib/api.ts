@@ -38,3 +38,68 @@ export async function analyzePatient(patientText: string): Promise<AnalysisResul
 
   return response.json();
 }
+
+export type AnalysisStage = 'agent0' | 'agent1' | 'agent2' | 'agent3' | 'agent4';
+
+export interface AnalysisTimings {
+  total_ms: number;
+  stages_ms: Partial<Record<AnalysisStage, number>>;
+}
+
+// Streams /analyze/stream (Server-Sent Events over POST) and calls onStage
+// as each agent finishes. Resolves with the timing summary from the final
+// "done" event.
+export async function analyzePatientStream(
+  patientText: string,
+  onStage: (stage: AnalysisStage, output: any) => void,
+  stages?: AnalysisStage[],
+): Promise<AnalysisTimings> {
+  const response = await fetch(`${BACKEND_URL}/analyze/stream`, {
+    method: 'POST',
+    headers: {
+      'Content-Type': 'application/json',
+    },
+    body: JSON.stringify({ text: patientText, stages }),
+  });
+
+  if (!response.ok || !response.body) {
+    throw new Error('Failed to analyze patient data');
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  let timings: AnalysisTimings = { total_ms: 0, stages_ms: {} };
+
+  while (true) {
+    const { done, value } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    let boundary = buffer.indexOf('\n\n');
+    while (boundary !== -1) {
+      const block = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+      boundary = buffer.indexOf('\n\n');
+
+      let event = 'message';
+      let data = '';
+      for (const line of block.split('\n')) {
+        if (line.startsWith('event: ')) event = line.slice(7);
+        else if (line.startsWith('data: ')) data += line.slice(6);
+      }
+      if (!data) continue;
+
+      const payload = JSON.parse(data);
+      if (event === 'error') {
+        throw new Error(payload.error || 'Failed to analyze patient data');
+      } else if (event === 'done') {
+        timings = payload;
+      } else {
+        onStage(event as AnalysisStage, payload);
+      }
+    }
+  }
+
+  return timings;
+}